@@ -7,39 +7,37 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
-from app.database import create_db_and_tables
-from app.routes import user, time, admin_users, task, admin_task, media
-from app.models.user import User
-from app.utils.security import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, Token
-
-from datetime import datetime
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-
-# The task to run
-def my_secondly_task():
-    print(f"Task is running at {datetime.now()}")
-    # ... additional task code goes here ...
-
-scheduler = BackgroundScheduler()
-trigger = CronTrigger(second=0)
+from app.database import create_db_and_tables, SessionDep, engine
+from app.migrations import run_migrations
+from app.routes import user, time, admin_users, task, admin_task, admin_jobs, calendar, events, media, leaderboard
+from app.models.user import User, attempt_log
+from app.settings import SCHEDULER_ENABLED, MEDIA_MAX_UPLOAD_BYTES
+from app.utils.limits import BodySizeLimit
+from app.utils.scheduler import task_scheduler
+from app.utils.security import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_token_claims, Token, \
+    authenticate_user
 
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
-    create_db_and_tables()
-    # scheduler.add_job(my_secondly_task, trigger)
-    # scheduler.start()
+    await create_db_and_tables()
+    await run_migrations()
+    attempt_log.start()
+    if SCHEDULER_ENABLED:
+        task_scheduler.start()
     print("startup")
     yield
     print("shutdown")
-    # scheduler.shutdown()
+    task_scheduler.stop()
+    await attempt_log.stop()
+    await engine.dispose()
 
 app = FastAPI(lifespan=app_lifespan)
 
 @app.post("/token")
-async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
-    this_user = User.get_user_by_username_or_email(form_data.username)
+async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: SessionDep):
+    this_user = await User.get_user_by_username_or_email(session, form_data.username)
+    this_user, new_hash = await authenticate_user(this_user, form_data.password)
 
     if not this_user:
         raise HTTPException(
@@ -48,9 +46,13 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    if new_hash:
+        this_user.hashed_password = new_hash
+        await session.commit()
+
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": this_user.username}, expires_delta=access_token_expires
+        data=get_token_claims(this_user), expires_delta=access_token_expires
     )
     return Token(access_token=access_token, token_type="bearer")
 
@@ -59,6 +61,7 @@ origins = [
     "http://localhost:5173",
 ]
 
+app.add_middleware(BodySizeLimit, path="/media/upload", max_bytes=MEDIA_MAX_UPLOAD_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -70,6 +73,10 @@ app.add_middleware(
 app.include_router(time.router, prefix="/time", tags=["time"])
 app.include_router(user.router, prefix="/user", tags=["user"])
 app.include_router(task.router, prefix="/task", tags=["task"])
+app.include_router(calendar.router, prefix="/calendar", tags=["calendar"])
+app.include_router(events.router, prefix="/events", tags=["events"])
 app.include_router(media.router, prefix="/media", tags=["media"])
+app.include_router(leaderboard.router, prefix="/leaderboard", tags=["leaderboard"])
 app.include_router(admin_users.router, prefix="/admin/user", tags=["Admin Users"])
-app.include_router(admin_task.router, prefix="/admin/task", tags=["Admin Tasks"])
\ No newline at end of file
+app.include_router(admin_task.router, prefix="/admin/task", tags=["Admin Tasks"])
+app.include_router(admin_jobs.router, prefix="/admin/jobs", tags=["Admin Jobs"])
\ No newline at end of file
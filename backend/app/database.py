@@ -1,32 +1,114 @@
-from contextlib import contextmanager
+import re
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends
-from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.settings import DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, SQLITE_PRAGMAS, QUERY_PLAN_CHECK
 
-db_file_name = "test.db"
-db_url = "sqlite:///" + db_file_name
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(db_url, connect_args=connect_args)
+FULL_SCAN = re.compile(
+    r"^SCAN (TABLE )?(?!sqlite_)\w+( AS \w+)?( USING (COVERING INDEX \w+|INDEX \w+|INTEGER PRIMARY KEY))?$"
+)
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(bind=engine)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+class FullTableScanError(Exception):
+    pass
+
+
+def is_full_scan(step: str, statement: str) -> bool:
+    """Whether an EXPLAIN QUERY PLAN step reads a whole table.
+
+    Walking an index in order reads every row too, unless the statement has a LIMIT,
+    which stops the walk after one page. Paging by offset still pays for the rows it
+    skips, so deep offsets are the caller's to keep in check.
+    """
+    if not (match := FULL_SCAN.match(step)):
+        return False
+    return match.group(3) is None or not LIMIT.search(statement)
+
+
+def check_query_plan(conn, cursor, statement, parameters, context, executemany):
+    """Fail any SELECT/UPDATE/DELETE that SQLite would answer with a full table scan.
+
+    Queries that scan on purpose opt out with .execution_options(allow_full_scan=True).
+    """
+    if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+        return
+    if context is not None and context.execution_options.get("allow_full_scan"):
+        return
+
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    for row in cursor.fetchall():
+        if is_full_scan(row[-1], statement):
+            raise FullTableScanError(f"{row[-1]} in: {statement}")
+
+
+def build_engine(db_url: str) -> AsyncEngine:
+    if not db_url.startswith("sqlite"):
+        return create_async_engine(
+            db_url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+
+    sqlite_engine = create_async_engine(
+        db_url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        connect_args={"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000},
+    )
+
+    @event.listens_for(sqlite_engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    if QUERY_PLAN_CHECK:
+        event.listen(sqlite_engine.sync_engine, "before_cursor_execute", check_query_plan)
 
+    return sqlite_engine
 
-@contextmanager
-def session_scope():
-    try:
-        with Session(engine) as session:
+
+engine = build_engine(DB_URL)
+
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+def dialect_insert(model):
+    """Insert statement for the active backend, supporting on_conflict_do_update/nothing."""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+@asynccontextmanager
+async def session_scope():
+    async with async_session() as session:
+        try:
             yield session
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def get_session():
+    async with session_scope() as session:
+        yield session
+
 
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
@@ -0,0 +1,106 @@
+"""
+Schema changes for databases created before a model changed. create_all only adds
+missing tables, so columns and indexes added to existing tables go here. Each step
+must be safe to run against a database that create_all just built from the models.
+"""
+import datetime
+
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, select, text, update
+from sqlmodel import SQLModel
+
+from app.database import dialect_insert, engine
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+)
+
+
+def add_tasktracker_attempts_total(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("tasktracker")}
+    if "attempts_total" not in columns:
+        conn.execute(text("ALTER TABLE tasktracker ADD COLUMN attempts_total INTEGER NOT NULL DEFAULT 0"))
+
+
+def create_model_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def unique_task_attempts(conn):
+    conn.execute(text(
+        "DELETE FROM taskattempt WHERE id NOT IN (SELECT MIN(id) FROM taskattempt GROUP BY date, user_id, text)"
+    ).execution_options(allow_full_scan=True))
+    conn.execute(text("DROP INDEX IF EXISTS ix_taskattempt_date_user_text"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_taskattempt_date_user_text ON taskattempt (date, user_id, text)"))
+
+
+def copy_tracker_attempts(conn):
+    """Move the answers kept in the old tasktracker.attempts JSON list into taskattempt.
+
+    The list only held washed texts in the order they were tried. A solved tracker's
+    last text was the correct one, solved at time_solved; the others get the start of
+    their day as created. The column itself is left in place and no longer read.
+    """
+    if "attempts" not in {c["name"] for c in inspect(conn).get_columns("tasktracker")}:
+        return
+
+    from app.models.user import TaskAttempt
+
+    trackers = Table("tasktracker", MetaData(), autoload_with=conn)
+    rows = conn.execute(
+        select(trackers.c.date, trackers.c.user_id, trackers.c.solved, trackers.c.time_solved,
+               trackers.c.attempts_total, trackers.c.attempts)
+        .where(trackers.c.attempts.is_not(None))
+        .execution_options(allow_full_scan=True)
+    ).all()
+
+    for date, user_id, solved, time_solved, attempts_total, attempts in rows:
+        if not attempts:
+            continue
+        day_start = datetime.datetime.combine(date, datetime.time.min)
+        copied = []
+        for i, attempt in enumerate(attempts):
+            correct = bool(solved) and i == len(attempts) - 1
+            created = time_solved if correct and time_solved else day_start
+            copied.append({"date": date, "user_id": user_id, "text": attempt, "correct": correct, "created": created})
+        conn.execute(dialect_insert(TaskAttempt).on_conflict_do_nothing(), copied)
+        if attempts_total < len(attempts):
+            conn.execute(
+                update(trackers)
+                .where(trackers.c.date == date, trackers.c.user_id == user_id)
+                .values(attempts_total=len(attempts))
+            )
+
+
+def userscore_rank_descending(conn):
+    from app.models.leaderboard import UserScore
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_userscore_rank"))
+    for index in UserScore.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, add_tasktracker_attempts_total),
+    (2, create_model_indexes),
+    (3, unique_task_attempts),
+    (4, copy_tracker_attempts),
+    (5, userscore_rank_descending),
+]
+
+
+def migrate(conn):
+    schema_version.create(conn, checkfirst=True)
+    current = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+    for version, step in MIGRATIONS:
+        if version > current:
+            step(conn)
+            conn.execute(schema_version.insert().values(version=version))
+
+
+async def run_migrations():
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate)
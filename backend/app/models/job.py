@@ -0,0 +1,52 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import UniqueConstraint, and_, or_
+from sqlmodel import SQLModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import dialect_insert
+from app.settings import JOB_STALE_SECONDS
+
+
+class JobRun(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job: str = Field(nullable=False)
+    run_key: str = Field(nullable=False)
+    status: str = Field(default="running")
+    started: datetime.datetime = Field(nullable=False)
+    finished: Optional[datetime.datetime] = Field(default=None)
+    error: Optional[str] = Field(default=None)
+
+    __table_args__ = (
+        UniqueConstraint("job", "run_key"),
+    )
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, job: str, run_key: str) -> Optional["JobRun"]:
+        """Insert the run row, or return None if the run is done or another worker holds it.
+
+        A failed run, or one still marked running after JOB_STALE_SECONDS because its
+        worker died, is taken over by the next worker that asks.
+        """
+        now = datetime.datetime.now()
+        statement = dialect_insert(cls).values(job=job, run_key=run_key, status="running", started=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.job, cls.run_key],
+            set_={"status": "running", "started": now, "finished": None, "error": None},
+            where=or_(
+                cls.status == "failed",
+                and_(cls.status == "running", cls.started < now - datetime.timedelta(seconds=JOB_STALE_SECONDS)),
+            ),
+        ).returning(cls.id)
+
+        run_id = (await session.exec(statement)).scalar()
+        await session.commit()
+        return await session.get(cls, run_id, populate_existing=True) if run_id is not None else None
+
+    async def finish(self, session: AsyncSession, error: Optional[str] = None):
+        self.status = "failed" if error else "done"
+        self.finished = datetime.datetime.now()
+        self.error = error
+        session.add(self)
+        await session.commit()
@@ -0,0 +1,108 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Index, delete, desc, func
+from sqlmodel import SQLModel, Field, select, or_, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import dialect_insert
+
+
+class UserScore(SQLModel, table=True):
+    user_id: str = Field(primary_key=True, foreign_key="user.id")
+    score: int = Field(default=0)
+    solved: int = Field(default=0)
+    time_total: int = Field(default=0)
+
+    __table_args__ = (
+        # same direction as the ORDER BY score DESC, time_total of every read, so ties need no sort
+        Index("ix_userscore_rank", desc("score"), "time_total"),
+    )
+
+    @classmethod
+    async def add_solve(cls, session: AsyncSession, user_id: str, score: int,
+                        open_time: datetime.datetime, time_solved: datetime.datetime):
+        seconds = max(int((time_solved - open_time).total_seconds()), 0)
+        statement = dialect_insert(cls).values(user_id=user_id, score=score, solved=1, time_total=seconds)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.user_id],
+            set_={
+                "score": cls.score + statement.excluded.score,
+                "solved": cls.solved + 1,
+                "time_total": cls.time_total + statement.excluded.time_total,
+            },
+        )
+        await session.exec(statement)
+
+    @classmethod
+    async def get_rank(cls, session: AsyncSession, user_id: str) -> Optional[int]:
+        """Counts the entries ahead of the user on ix_userscore_rank. That reads index
+        pages only, but still grows with the rank rather than with log n."""
+        if not (entry := await session.get(cls, user_id)):
+            return None
+
+        ahead = (await session.exec(
+            select(func.count())
+            .select_from(cls)
+            .where(or_(
+                cls.score > entry.score,
+                and_(cls.score == entry.score, cls.time_total < entry.time_total)))
+        )).one()
+        return ahead + 1
+
+
+class DailyResult(SQLModel, table=True):
+    date: datetime.date = Field(primary_key=True)
+    user_id: str = Field(primary_key=True, foreign_key="user.id")
+    rank: int = Field(nullable=False)
+    score: int = Field(default=0)
+    hints_used: int = Field(default=0)
+    time_solved: Optional[datetime.datetime] = Field(default=None)
+
+    __table_args__ = (
+        Index("ix_dailyresult_date_rank", "date", "rank"),
+    )
+
+
+async def freeze_daily_results(session: AsyncSession, date: datetime.date) -> int:
+    from app.models.user import TaskTracker
+
+    trackers = (await session.exec(
+        select(TaskTracker.user_id, TaskTracker.score, TaskTracker.hints_used, TaskTracker.time_solved)
+        .where(TaskTracker.date == date, TaskTracker.solved)
+        .order_by(TaskTracker.score.desc(), TaskTracker.time_solved)
+    )).all()
+
+    await session.exec(delete(DailyResult).where(DailyResult.date == date))
+    if trackers:
+        await session.exec(dialect_insert(DailyResult), params=[
+            {"date": date, "user_id": user_id, "rank": rank, "score": score,
+             "hints_used": hints_used, "time_solved": time_solved}
+            for rank, (user_id, score, hints_used, time_solved) in enumerate(trackers, start=1)
+        ])
+    await session.commit()
+    return len(trackers)
+
+
+async def rebuild_leaderboard(session: AsyncSession) -> int:
+    from app.models.task import Task
+    from app.models.user import TaskTracker
+
+    totals = {}
+    rows = await session.stream(
+        select(TaskTracker.user_id, TaskTracker.score, TaskTracker.time_solved, Task.open_time)
+        .join(Task, Task.date == TaskTracker.date)
+        .where(TaskTracker.solved)
+        .execution_options(allow_full_scan=True)
+    )
+    async for user_id, score, time_solved, open_time in rows:
+        entry = totals.setdefault(user_id, {"user_id": user_id, "score": 0, "solved": 0, "time_total": 0})
+        entry["score"] += score
+        entry["solved"] += 1
+        entry["time_total"] += max(int((time_solved - open_time).total_seconds()), 0)
+
+    await session.exec(delete(UserScore).execution_options(allow_full_scan=True))
+    if totals:
+        await session.exec(dialect_insert(UserScore), params=list(totals.values()))
+    await session.commit()
+    return len(totals)
@@ -6,9 +6,6 @@ from sqlmodel import SQLModel, Field, Relationship
 
 if TYPE_CHECKING:
     from app.models.task import Task
-    from app.models.user import TaskTracker
-
-from app.utils.security import generate_uid
 
 class MediaTypes(str, Enum):
     PNG = "image/png"
@@ -17,34 +14,26 @@ class MediaTypes(str, Enum):
     MP3 = "audio/mp3"
     MP4 = "video/mp4"
     MD = "text/markdown"
+    WEBP = "image/webp"
 
 
 class TaskMedia(SQLModel, table=True):
     file_name: str = Field(nullable=False, primary_key=True)
     hint_number: int = Field(default=0, nullable=False)
-    date: datetime.date = Field(foreign_key="task.date")
+    date: datetime.date = Field(foreign_key="task.date", index=True)
     media_type: MediaTypes
     description: str = Field(nullable=True)
     task: "Task" = Relationship(back_populates="media")
 
-    def is_locked(self, user, session) -> bool:
-        match self.task.status:
+    def is_locked(self, task, task_tracker) -> bool:
+        match task.status:
             case "closed": return True
             case "expired": return False
-            case "open":
-                if task_tracker := TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session):
-                    return self.hint_number > task_tracker.hints_used
             case _:
-                return False
-
-        if task_tracker := TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session):
-            return self.hint_number > task_tracker.hints_used
-
-        return False
+                return not task_tracker.solved and self.hint_number > task_tracker.hints_used
 
     @classmethod
-    def create_media_dict(cls, file, date, hint_number):
-        file_name = generate_uid() + "." + file.filename.split(".")[-1]
+    def create_media_dict(cls, file, file_name, date, hint_number):
         file_extension = file.filename.split(".")[-1]
         task_media_dict = {
             "date": date,
@@ -54,3 +43,10 @@ class TaskMedia(SQLModel, table=True):
             "hint_number": hint_number,
         }
         return cls(**task_media_dict)
+
+
+class TaskMediaVariant(SQLModel, table=True):
+    variant_file_name: str = Field(primary_key=True)
+    file_name: str = Field(foreign_key="taskmedia.file_name", index=True)
+    width: int = Field(nullable=False)
+    media_type: MediaTypes
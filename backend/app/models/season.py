@@ -0,0 +1,176 @@
+import asyncio
+import datetime
+import os
+from itertools import groupby
+from typing import AsyncIterator, Optional
+
+from cryptography.fernet import InvalidToken
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import session_scope
+from app.models.media import TaskMedia, TaskMediaVariant, MediaTypes
+from app.models.task import Task, TaskAnswer, TaskHint, task_status
+from app.schemas.task import TaskImport
+from app.settings import EXPORT_BATCH_SIZE
+from app.utils.encryption import enigma, run_enigma
+from app.utils.media_store import media_store
+from app.utils.time import get_open_close_time
+
+MEDIA_TYPES = {media_type.value for media_type in MediaTypes}
+
+
+async def read_season(lines: AsyncIterator[bytes]) -> list[TaskImport]:
+    """Validate every NDJSON line and fail with all problems at once."""
+    tasks, errors, dates = [], [], set()
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            task = TaskImport.model_validate_json(line)
+        except ValidationError as e:
+            errors.append({"line": line_number, "errors": e.errors(include_url=False, include_context=False, include_input=False)})
+            continue
+
+        if task.date in dates:
+            errors.append({"line": line_number, "errors": [f"duplicate date {task.date}"]})
+        dates.add(task.date)
+        for media in task.media:
+            if media.media_type not in MEDIA_TYPES:
+                errors.append({"line": line_number, "errors": [f"unsupported media type {media.media_type}"]})
+            elif not os.path.exists(media_store.path(media.file_name)):
+                errors.append({"line": line_number, "errors": [f"media file {media.file_name} not uploaded"]})
+        tasks.append(task)
+
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    return tasks
+
+
+async def encrypt_answers(tasks: list[TaskImport]) -> list[str]:
+    """Encrypt plaintext answers and verify already encrypted ones on the enigma pool."""
+    jobs = [
+        run_enigma(enigma.encrypt_answer, task.answer) if task.answer is not None
+        else run_enigma(enigma.check_token, task.answer_encrypted)
+        for task in tasks
+    ]
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+
+    errors = [str(task.date) for task, result in zip(tasks, results) if isinstance(result, InvalidToken)]
+    if errors:
+        raise HTTPException(status_code=422, detail=f"answer_encrypted not valid for this key on {', '.join(errors)}")
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+async def import_season(session: AsyncSession, tasks: list[TaskImport], replace: bool = False) -> dict:
+    dates = [task.date for task in tasks]
+    existing = (await session.exec(
+        select(Task.date, Task.open_time, Task.close_time).where(Task.date.in_(dates))
+    )).all()
+    if existing and not replace:
+        raise HTTPException(status_code=409, detail=f"tasks exist on {', '.join(str(row[0]) for row in existing)}")
+    if any(task_status(open_time, close_time) != "closed" for _, open_time, close_time in existing):
+        raise HTTPException(status_code=403, detail="cannot replace open or expired task")
+
+    answers = await encrypt_answers(tasks)
+
+    task_rows, answer_rows, hint_rows, media_rows = [], [], [], []
+    for task, answer in zip(tasks, answers):
+        task_rows.append({
+            "date": task.date,
+            "info": task.info,
+            "open_time": get_open_close_time(task.date, task.open_time),
+            "close_time": get_open_close_time(task.date, task.close_time),
+        })
+        answer_rows.append({
+            "date": task.date,
+            "text": answer,
+            "yt_url": task.yt_url.unicode_string() if task.yt_url else None,
+        })
+        hint_rows += [
+            {"date": task.date, "hint_number": number, "info": hint.info}
+            for number, hint in enumerate(task.hints, start=1)
+        ]
+        media_rows += [
+            {"date": task.date, **media.model_dump(), "media_type": MediaTypes(media.media_type)}
+            for media in task.media
+        ]
+
+    try:
+        if existing:
+            replaced = [row[0] for row in existing]
+            await session.exec(delete(TaskMediaVariant).where(TaskMediaVariant.file_name.in_(
+                select(TaskMedia.file_name).where(TaskMedia.date.in_(replaced))
+            )))
+            for model in (TaskMedia, TaskHint, TaskAnswer, Task):
+                await session.exec(delete(model).where(model.date.in_(replaced)))
+
+        for model, rows in ((Task, task_rows), (TaskAnswer, answer_rows), (TaskHint, hint_rows), (TaskMedia, media_rows)):
+            if rows:
+                await session.exec(insert(model), params=rows)
+        await session.commit()
+
+    except IntegrityError as e:
+        await session.rollback()
+        raise HTTPException(status_code=422, detail=str(e.orig))
+
+    return {"tasks": len(task_rows), "hints": len(hint_rows), "media": len(media_rows), "replaced": len(existing)}
+
+
+async def export_season(start: Optional[datetime.date] = None,
+                        end: Optional[datetime.date] = None) -> AsyncIterator[bytes]:
+    """NDJSON lines in the import format, read in batches of EXPORT_BATCH_SIZE days.
+
+    Answers are exported encrypted, so the export never decrypts and only re-imports
+    under the same answer key.
+    """
+    statement = (
+        select(Task.date, Task.info, Task.open_time, Task.close_time, TaskAnswer.text, TaskAnswer.yt_url)
+        .join(TaskAnswer, TaskAnswer.date == Task.date)
+        .order_by(Task.date)
+    )
+    if start is not None:
+        statement = statement.where(Task.date >= start)
+    if end is not None:
+        statement = statement.where(Task.date <= end)
+
+    async with session_scope() as session:
+        rows = await session.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE, allow_full_scan=True))
+        async for batch in rows.partitions():
+            dates = [row[0] for row in batch]
+            hints = (await session.exec(
+                select(TaskHint).where(TaskHint.date.in_(dates)).order_by(TaskHint.date, TaskHint.hint_number)
+            )).all()
+            media = (await session.exec(
+                select(TaskMedia).where(TaskMedia.date.in_(dates)).order_by(TaskMedia.date, TaskMedia.hint_number)
+            )).all()
+            hints_by_date = {date: list(group) for date, group in groupby(hints, key=lambda hint: hint.date)}
+            media_by_date = {date: list(group) for date, group in groupby(media, key=lambda item: item.date)}
+
+            lines = []
+            for date, info, open_time, close_time, answer, yt_url in batch:
+                task = TaskImport(
+                    date=date,
+                    info=info,
+                    open_time=open_time.hour,
+                    close_time=close_time.hour,
+                    answer_encrypted=answer,
+                    yt_url=yt_url,
+                    hints=[{"info": hint.info} for hint in hints_by_date.get(date, [])],
+                    media=[
+                        {**item.model_dump(exclude={"date"}), "media_type": item.media_type.value}
+                        for item in media_by_date.get(date, [])
+                    ],
+                )
+                lines.append(task.model_dump_json(exclude={"author", "answer"}).encode())
+            yield b"\n".join(lines) + b"\n"
+            session.expunge_all()
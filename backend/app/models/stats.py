@@ -0,0 +1,116 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Column, JSON, func, case
+from sqlmodel import SQLModel, Field, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import dialect_insert
+from app.schemas.task import TaskStatsRead
+
+COUNTERS = ("participants", "attempts", "wrong_attempts", "solves", "hints_unlocked")
+TOP_WRONG_ANSWERS = 10
+
+
+class TaskStats(SQLModel, table=True):
+    date: datetime.date = Field(primary_key=True)
+    participants: int = Field(default=0)
+    attempts: int = Field(default=0)
+    wrong_attempts: int = Field(default=0)
+    solves: int = Field(default=0)
+    hints_unlocked: int = Field(default=0)
+    frozen: bool = Field(default=False)
+    summary: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+
+    @classmethod
+    async def increment(cls, session: AsyncSession, date: datetime.date, **counts: int):
+        """Add to the day's counters in the caller's transaction. Frozen days are left alone."""
+        statement = dialect_insert(cls).values(date=date, **counts)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.date],
+            set_={k: getattr(cls, k) + getattr(statement.excluded, k) for k in counts},
+            where=~cls.frozen,
+        )
+        await session.exec(statement)
+
+
+async def count_task_stats(session: AsyncSession, date: datetime.date) -> dict:
+    from app.models.user import TaskTracker
+
+    participants, solves, attempts, hints_unlocked = (await session.exec(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((TaskTracker.solved, 1), else_=0)), 0),
+            func.coalesce(func.sum(TaskTracker.attempts_total), 0),
+            func.coalesce(func.sum(TaskTracker.hints_used), 0),
+        ).where(TaskTracker.date == date)
+    )).one()
+    return {
+        "participants": participants,
+        "attempts": attempts,
+        "wrong_attempts": attempts - solves,
+        "solves": solves,
+        "hints_unlocked": hints_unlocked,
+    }
+
+
+async def compute_task_stats(session: AsyncSession, date: datetime.date, open_time: datetime.datetime,
+                             counters: dict, frozen: bool = False) -> TaskStatsRead:
+    from app.models.user import TaskTracker, TaskAttempt
+
+    solved = (TaskTracker.date == date) & TaskTracker.solved
+
+    hint_distribution = dict((await session.exec(
+        select(TaskTracker.hints_used, func.count()).where(solved).group_by(TaskTracker.hints_used)
+    )).all())
+    solvers = sum(hint_distribution.values())
+
+    median_seconds = attempts_per_solver = None
+    if solvers:
+        median_time = (await session.exec(
+            select(TaskTracker.time_solved).where(solved)
+            .order_by(TaskTracker.time_solved).offset((solvers - 1) // 2).limit(1)
+        )).one()
+        median_seconds = max(int((median_time - open_time).total_seconds()), 0)
+        attempts_per_solver = (await session.exec(select(func.avg(TaskTracker.attempts_total)).where(solved))).one()
+
+    top_wrong_answers = (await session.exec(
+        select(TaskAttempt.text, func.count().label("count"))
+        .where(TaskAttempt.date == date, ~TaskAttempt.correct)
+        .group_by(TaskAttempt.text)
+        .order_by(func.count().desc())
+        .limit(TOP_WRONG_ANSWERS)
+    )).all()
+
+    return TaskStatsRead(
+        date=date,
+        frozen=frozen,
+        solve_rate=counters["solves"] / counters["participants"] if counters["participants"] else 0.0,
+        median_seconds_to_solve=median_seconds,
+        attempts_per_solver=attempts_per_solver,
+        hint_distribution=hint_distribution,
+        top_wrong_answers=[{"text": text, "count": count} for text, count in top_wrong_answers],
+        **counters,
+    )
+
+
+async def get_task_stats(session: AsyncSession, date: datetime.date,
+                         open_time: datetime.datetime) -> TaskStatsRead:
+    stats = await session.get(TaskStats, date)
+    if stats is not None and stats.frozen and stats.summary is not None:
+        return TaskStatsRead.model_validate(stats.summary)
+
+    counters = {k: getattr(stats, k) if stats else 0 for k in COUNTERS}
+    return await compute_task_stats(session, date, open_time, counters)
+
+
+async def freeze_task_stats(session: AsyncSession, date: datetime.date, open_time: datetime.datetime):
+    """Recount the day from the trackers and store the full result, which is served from then on."""
+    counters = await count_task_stats(session, date)
+    summary = await compute_task_stats(session, date, open_time, counters, frozen=True)
+
+    values = {**counters, "frozen": True, "summary": summary.model_dump(mode="json")}
+    statement = dialect_insert(TaskStats).values(date=date, **values)
+    statement = statement.on_conflict_do_update(index_elements=[TaskStats.date], set_=values)
+    await session.exec(statement)
+    await session.commit()
@@ -1,18 +1,35 @@
+import asyncio
 import datetime
 from typing import List, Optional, Union
 
 from fastapi import HTTPException
+from pydantic import TypeAdapter
 from sqlalchemy import UniqueConstraint
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import SQLModel, Field, Relationship, Session, select
+from sqlalchemy.orm import joinedload
+from sqlmodel import SQLModel, Field, Relationship, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.database import session_scope
 from app.models.media import TaskMedia
-from app.schemas.task import TaskAdminRead
+from app.schemas.task import TaskAdminRead, TaskUserRead, CalendarDay, TaskHintRead, TaskMediaRead
 from app.schemas.task import TaskCreate, TaskUpdate
+from app.utils.cache import body_etag
 from app.utils.encryption import enigma
+from app.utils.security import sign_media_url, public_media_url
 from app.utils.time import get_open_close_time
 
+ADMIN_MEDIA_USER = "admin"
+
+
+def task_status(open_time: datetime.datetime, close_time: datetime.datetime) -> str:
+    now = datetime.datetime.now()
+    if open_time > now:
+        return "closed"
+    elif open_time < now < close_time:
+        return "open"
+    else:
+        return "expired"
+
 
 class Task(SQLModel, table=True):
     date: datetime.date = Field(default=datetime.date.today(), primary_key=True, unique=True)
@@ -24,8 +41,12 @@ class Task(SQLModel, table=True):
     media: List["TaskMedia"] = Relationship(back_populates="task", cascade_delete=True)
 
     @classmethod
-    def get_task(cls, session: Session, date: datetime.date = datetime.date.today()) -> Optional["Task"]:
-        task = session.exec(select(cls).where(cls.date == date)).first()
+    async def get_task(cls, session: AsyncSession, date: datetime.date = datetime.date.today()) -> Optional["Task"]:
+        task = (await session.exec(
+            select(cls)
+            .where(cls.date == date)
+            .options(joinedload(cls.answer), joinedload(cls.hints), joinedload(cls.media))
+        )).unique().first()
         return task
 
     def get_admin_task(self) -> TaskAdminRead:
@@ -36,23 +57,40 @@ class Task(SQLModel, table=True):
             admin_task_dict["answer_plaintext"] = enigma.decrypt_answer(self.answer.text)
             admin_task_dict["answer"] = self.answer.model_dump()
 
-        admin_task_dict["media"] = self.media
+        admin_task_dict["media"] = [self.media_read(media, ADMIN_MEDIA_USER) for media in self.media]
         admin_task_dict["hints"] = self.hints
 
         return TaskAdminRead(**admin_task_dict)
 
+    def media_read(self, media: TaskMedia, user_id: str) -> TaskMediaRead:
+        if self.status == "expired":
+            url = public_media_url(media.file_name)
+        else:
+            url = sign_media_url(media.file_name, user_id)
+        return TaskMediaRead(url=url, **media.model_dump())
+
+    def get_unlocked_media(self, task_tracker, user_id: str) -> List[TaskMediaRead]:
+        return [self.media_read(media, user_id) for media in self.media if not media.is_locked(self, task_tracker)]
+
+    def get_unlocked_hints(self, task_tracker, user_id: str) -> List[TaskHintRead]:
+        media = self.get_unlocked_media(task_tracker, user_id)
+        return [
+            TaskHintRead(media=[m for m in media if m.hint_number == hint.hint_number], **hint.model_dump())
+            for hint in self.hints
+            if task_tracker.solved or hint.hint_number <= task_tracker.hints_used
+        ]
+
     def check_answer(self, text) -> bool:
-        return enigma.compare_answer(text, self.answer.text)
+        return enigma.compare_answer(text, self.answer.text, key=self.date)
 
     @property
     def status(self) -> str:
+        return task_status(self.open_time, self.close_time)
+
+    @property
+    def next_transition(self) -> Optional[datetime.datetime]:
         now = datetime.datetime.now()
-        if self.open_time > now:
-            return "closed"
-        elif self.open_time < now < self.close_time:
-            return "open"
-        else:
-            return "expired"
+        return next((t for t in (self.open_time, self.close_time) if t > now), None)
 
 
 class TaskHint(SQLModel, table=True):
@@ -73,45 +111,203 @@ class TaskAnswer(SQLModel, table=True):
     yt_url: Optional[str]
 
 
-def create_or_update_task(data: Union[TaskCreate, TaskUpdate], date) -> TaskAdminRead:
+class DailyTaskSnapshot:
+    """Today's task with answer, hints and media loaded, shared between requests.
+
+    Reloaded when the day changes or when an admin write calls invalidate(). The
+    status is computed on access, so opening and closing need no reload and the
+    scheduler can load the task ahead of its open time.
+    """
+
+    def __init__(self):
+        self.task: Optional[Task] = None
+        self.expires: Optional[datetime.datetime] = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.expires is None or datetime.datetime.now() >= self.expires
+
+    async def get(self, session: AsyncSession) -> Optional[Task]:
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    await self.load(session)
+        return self.task
+
+    async def load(self, session: AsyncSession):
+        today = datetime.date.today()
+        task = await Task.get_task(session, today)
+        expires = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min)
+
+        if task is not None:
+            session.expunge(task)
+
+        self.task = task
+        self.expires = expires
+
+    def invalidate(self, date: Optional[datetime.date] = None):
+        if date is None or date == datetime.date.today():
+            self.expires = None
+
+
+daily_task = DailyTaskSnapshot()
+
+
+class PublicTaskCache:
+    """Encoded TaskUserRead bodies and their ETags, keyed by date and status.
+
+    Built from the task columns alone, so the answer is never loaded or decrypted.
+    Status is part of the key, so opening and closing switch to a new entry by
+    themselves; admin writes call invalidate(). As on the calendar, info is left
+    out until the task has opened. Once the task has expired its media is open to
+    everyone, so the body lists it with unsigned URLs.
+    """
+
+    def __init__(self):
+        self._rows: dict[datetime.date, dict] = {}
+        self._bodies: dict[tuple[datetime.date, str], tuple[bytes, str]] = {}
+
+    async def _row(self, session: AsyncSession, date: datetime.date) -> Optional[dict]:
+        if (row := self._rows.get(date)) is None:
+            task = (await session.exec(
+                select(Task.date, Task.open_time, Task.close_time, Task.info).where(Task.date == date)
+            )).first()
+            if task is None:
+                return None
+            row = self._rows[date] = task._asdict()
+        return row
+
+    async def status(self, session: AsyncSession, date: datetime.date) -> Optional[str]:
+        if (row := await self._row(session, date)) is None:
+            return None
+        return task_status(row["open_time"], row["close_time"])
+
+    async def get(self, session: AsyncSession, date: datetime.date,
+                  status: Optional[str] = None) -> Optional[tuple[bytes, str]]:
+        if (row := await self._row(session, date)) is None:
+            return None
+
+        status = status or task_status(row["open_time"], row["close_time"])
+        if (entry := self._bodies.get((date, status))) is None:
+            public = {**row, "info": row["info"] if status != "closed" else None}
+            if status == "expired":
+                media = (await session.exec(
+                    select(TaskMedia).where(TaskMedia.date == date).order_by(TaskMedia.hint_number)
+                )).all()
+                public["media"] = [
+                    TaskMediaRead(url=public_media_url(item.file_name), **item.model_dump()) for item in media
+                ]
+            body = TaskUserRead(status=status, **public).model_dump_json().encode()
+            entry = self._bodies[(date, status)] = (body, body_etag(body))
+        return entry
+
+    def invalidate(self, date: Optional[datetime.date] = None):
+        if date is None:
+            self._rows.clear()
+            self._bodies.clear()
+            return
+        self._rows.pop(date, None)
+        for key in [key for key in self._bodies if key[0] == date]:
+            del self._bodies[key]
+
+
+public_tasks = PublicTaskCache()
+
+
+class CalendarCache:
+    """Encoded list of every day's public fields and status, built with one query.
+
+    Kept until the next open or close time of any task, or until an admin write
+    calls invalidate(). A day's info is left out until the task has opened.
+    """
+
+    days_adapter = TypeAdapter(List[CalendarDay])
+
+    def __init__(self):
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.expires: Optional[datetime.datetime] = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.body is None or (self.expires is not None and datetime.datetime.now() >= self.expires)
+
+    async def get(self, session: AsyncSession) -> tuple[bytes, str]:
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    await self.load(session)
+        return self.body, self.etag
+
+    async def load(self, session: AsyncSession):
+        rows = (await session.exec(
+            select(Task.date, Task.open_time, Task.close_time, Task.info)
+            .order_by(Task.date)
+            .execution_options(allow_full_scan=True)
+        )).all()
+
+        now = datetime.datetime.now()
+        days = []
+        for date, open_time, close_time, info in rows:
+            status = task_status(open_time, close_time)
+            days.append(CalendarDay(
+                date=date, open_time=open_time, close_time=close_time, status=status,
+                info=info if status != "closed" else None,
+            ))
+
+        self.body = self.days_adapter.dump_json(days)
+        self.etag = body_etag(self.body)
+        self.expires = min((t for _, open_time, close_time, _ in rows for t in (open_time, close_time) if t > now),
+                           default=None)
+
+    def invalidate(self):
+        self.body = None
+
+
+calendar_cache = CalendarCache()
+
+
+async def create_or_update_task(session: AsyncSession, data: Union[TaskCreate, TaskUpdate], date) -> TaskAdminRead:
     try:
-        with session_scope() as session:
-            task_dict = {k: v for k, v in data.model_dump().items() if v is not None}
+        task_dict = {k: v for k, v in data.model_dump().items() if v is not None}
+
+        for k, v in task_dict.items():
+            match k:
+                case "open_time" | "close_time":
+                    task_dict[k] = get_open_close_time(date, v)
+                case "answer":
+                    task_dict[k] = enigma.encrypt_answer(task_dict.get("answer"))
+                case "yt_url":
+                    task_dict[k] = task_dict.get("yt_url").unicode_string()
+
+        answer_dict = {
+            "text": task_dict.pop("answer", None),
+            "yt_url": task_dict.pop("yt_url", None)
+        }
 
+        if task := await Task.get_task(session, date):
+            if task.status != "closed":
+                raise HTTPException(status_code=403, detail="cannot edit open or expired task")
             for k, v in task_dict.items():
-                match k:
-                    case "open_time" | "close_time":
-                        task_dict[k] = get_open_close_time(date, v)
-                    case "answer":
-                        task_dict[k] = enigma.encrypt_answer(task_dict.get("answer"))
-                    case "yt_url":
-                        task_dict[k] = task_dict.get("yt_url").unicode_string()
-
-            answer_dict = {
-                "text": task_dict.pop("answer", None),
-                "yt_url": task_dict.pop("yt_url", None)
-            }
-
-            if task := Task.get_task(session, date):
-                if task.status != "closed":
-                    raise HTTPException(status_code=403, detail="cannot edit open or expired task")
-                for k, v in task_dict.items():
-                    setattr(task, k, v)
-                answer = task.answer
-                for k, v in answer_dict.items():
-                    if v is not None:
-                        setattr(answer, k, v)
-
-            else:
-                task = Task(date=date, **task_dict)
-                answer = TaskAnswer(date=date, **answer_dict)
-
-            session.add(task)
-            session.add(answer)
-            session.commit()
-            session.refresh(answer)
-            session.refresh(task)
-            return task.get_admin_task()
+                setattr(task, k, v)
+            answer = task.answer
+            for k, v in answer_dict.items():
+                if v is not None:
+                    setattr(answer, k, v)
+
+        else:
+            task = Task(date=date, **task_dict)
+            answer = TaskAnswer(date=date, **answer_dict)
+
+        session.add(task)
+        session.add(answer)
+        await session.commit()
+        if answer_dict["text"] is not None:
+            enigma.forget_matcher(date)
+        daily_task.invalidate(date)
+        public_tasks.invalidate(date)
+        calendar_cache.invalidate()
+        return (await Task.get_task(session, date)).get_admin_task()
 
     except IntegrityError as e:
         raise HTTPException(status_code=422, detail=str(e))
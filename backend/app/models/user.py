@@ -1,24 +1,30 @@
 import datetime
-from typing import Optional, List, Annotated
+from typing import Optional, List, Annotated, AsyncIterator
 
 from fastapi import HTTPException
 from fastapi.params import Depends
 
-from sqlalchemy import Column, JSON, UniqueConstraint
-from sqlalchemy.orm import attributes
-from sqlmodel import SQLModel, Field, Relationship, select, or_, Session
+from sqlalchemy import UniqueConstraint, Index, event, inspect, func, case, update
+from sqlmodel import SQLModel, Field, Relationship, select, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
-from app.database import session_scope
+from app.database import SessionDep, dialect_insert, session_scope
+from app.models.leaderboard import UserScore
+from app.models.stats import TaskStats
 from app.models.task import Task
-from app.schemas.user import UserCreate
-from app.settings import ATTEMPTS_PER_RESET, SCORES_PER_HINT_USED
+from app.schemas.user import UserCreate, UserDashboard
+from app.settings import EXPORT_BATCH_SIZE, ATTEMPT_LOG_MAX_PENDING, ATTEMPTS_PER_RESET, ATTEMPTS_RESET_SECONDS, SCORES_PER_HINT_USED, USER_CACHE_SIZE, USER_CACHE_TTL, \
+    STATELESS_TOKENS
+from app.utils.admission import tracker_locks
+from app.utils.batcher import WriteBehindBatcher
+from app.utils.cache import TTLCache
 from app.utils.input import string_washer
-from app.utils.security import generate_uid, get_password_hash, oauth2_scheme, decode_payload
+from app.utils.security import generate_uid, password_hasher, oauth2_scheme, optional_oauth2_scheme, decode_payload, token_revocations
 
 
 class User(SQLModel, table=True):
-    id: Optional[str] = Field(primary_key=True, default=generate_uid())
+    id: Optional[str] = Field(primary_key=True, default_factory=generate_uid)
     username: str = Field(unique=True)
     full_name: str = Field()
     email: str = Field(unique=True)
@@ -27,24 +33,46 @@ class User(SQLModel, table=True):
     results: List["TaskTracker"] = Relationship(back_populates="user", cascade_delete=True)
 
     @classmethod
-    def create_user(cls, user: "UserCreate") -> "User":
+    async def create_user(cls, user: "UserCreate") -> "User":
         user_dict = user.model_dump()
-        hashed_password = get_password_hash(password=user_dict.pop("password"))
+        hashed_password = await password_hasher.hash(user_dict.pop("password"))
         user_dict["hashed_password"] = hashed_password
         return cls(**user_dict)
 
     @classmethod
-    def get_user_by_username_or_email(cls, username: str) -> Optional["User"]:
-        with session_scope() as session:
-            if user := (
-                    session.exec(
-                        select(cls)
-                                .where(or_(
-                            cls.username == username,
-                            cls.email == username)))
-                            .first()):
-                return user
-        return None
+    async def get_user_by_username_or_email(cls, session: AsyncSession, username: str) -> Optional["User"]:
+        return (await session.exec(
+            select(cls)
+            .where(or_(
+                cls.username == username,
+                cls.email == username))
+        )).first()
+
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target: User):
+    state = inspect(target)
+    for attr in ("username", "email"):
+        history = state.attrs[attr].history
+        for key in (*history.added, *history.unchanged, *history.deleted):
+            user_cache.invalidate(key)
+
+
+@event.listens_for(User, "after_update")
+def revoke_tokens_on_change(mapper, connection, target: User):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in ("username", "email", "full_name")):
+        token_revocations.revoke(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def revoke_tokens_on_delete(mapper, connection, target: User):
+    token_revocations.revoke(target.id)
 
 
 class TaskTracker(SQLModel, table=True):
@@ -56,70 +84,208 @@ class TaskTracker(SQLModel, table=True):
     hints_used: int = Field(default=0)
     attempts_left: int = Field(default=ATTEMPTS_PER_RESET)
     attempts_reset: Optional[datetime.datetime] = Field(default=None)
-    attempts: list[str] = Field(default=[], sa_column=Column(JSON))
+    attempts_total: int = Field(default=0)
     user: User = Relationship(back_populates="results")
 
     __table_args__ = (
         UniqueConstraint("date", "user_id"),
+        Index("ix_tasktracker_user_id", "user_id"),
+        Index("ix_tasktracker_date_rank", "date", "solved", "score", "time_solved"),
     )
 
     @classmethod
-    def get_or_create_daily_task_tracker(cls, user_id: str, session: Session,
-                                         task_date: datetime.date = datetime.date.today()):
-        task = session.exec(select(cls).filter_by(user_id=user_id, date=task_date)).first()
-        if not task:
-            task = cls(user_id=user_id, date=task_date)
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-        return task
-
-    def check_attempt(self, text: str, task: Task, session) -> str:
+    async def get_daily_task_tracker(cls, user_id: str, session: AsyncSession,
+                                     task_date: Optional[datetime.date] = None) -> "TaskTracker":
+        """Persisted tracker for the day, or an unsaved default one. Never writes."""
+        task_date = task_date or datetime.date.today()
+        if tracker := (await session.exec(
+                select(cls).filter_by(user_id=user_id, date=task_date).execution_options(populate_existing=True)
+        )).first():
+            return tracker
+        return cls(user_id=user_id, date=task_date)
+
+    @property
+    def is_new(self) -> bool:
+        return not inspect(self).persistent
+
+    @classmethod
+    async def ensure(cls, session: AsyncSession, user_id: str, date: datetime.date) -> bool:
+        """Insert the day's default row unless it exists. True if this call inserted it."""
+        statement = dialect_insert(cls).values(**cls(user_id=user_id, date=date).model_dump())
+        statement = statement.on_conflict_do_nothing(index_elements=[cls.date, cls.user_id]).returning(cls.user_id)
+        return (await session.exec(statement)).scalar() is not None
+
+    @classmethod
+    async def unlock_hint(cls, session: AsyncSession, user_id: str, date: datetime.date,
+                          hints: int) -> tuple[bool, "TaskTracker"]:
+        """Count one more hint unless the task is solved or all hints are used.
+
+        Only hints_used changes, as hints_used + 1 in SQL, so an unlock racing an answer
+        can neither be lost nor change a score that is already set.
+        """
+        created = await cls.ensure(session, user_id, date)
+        unlocked = (await session.exec(
+            update(cls)
+            .where(cls.user_id == user_id, cls.date == date, ~cls.solved, cls.hints_used < hints)
+            .values(hints_used=cls.hints_used + 1)
+            .returning(cls.hints_used)
+        )).scalar() is not None
+        if created or unlocked:
+            await TaskStats.increment(session, date, participants=int(created), hints_unlocked=int(unlocked))
+        tracker = await cls.get_daily_task_tracker(user_id, session, date)
+        await session.commit()
+        return unlocked, tracker
+
+    @classmethod
+    async def attempt(cls, session: AsyncSession, user_id: str, task: Task, text: str) -> tuple[str, "TaskTracker"]:
+        """Check an answer and count it on the day's tracker.
+
+        Attempts of one user on one day run one at a time in this worker, so the
+        duplicate check and the attempt it guards cannot interleave. The counters
+        change through conditional UPDATEs, so the limits also hold across workers.
+        """
         text = string_washer(text)
-        message = "incorrect"
-
-        if self.solved:
-            message = "solved"
-        elif text in self.attempts:
-            message = "duplicate"
-        elif self.attempts_left <= 0:
-            if self.attempts_reset is not None:
-                if datetime.datetime.now() >= self.attempts_reset:
-                    self.attempts_left = ATTEMPTS_PER_RESET
-                    self.attempts_reset = None
-                    message = self.check_attempt(text, task, session)
-                else:
-                    message = "no_attempts"
-
-        else:
-            self.attempts.append(text)
-            self.attempts_left -= 1
-
-            if self.attempts_left <= 0:
-                self.attempts_reset = datetime.datetime.now() + datetime.timedelta(seconds=30)
-
-            attributes.flag_modified(self, 'attempts')
-
-            if task.check_answer(text=text):
-                self.solved = True
-                self.time_solved = datetime.datetime.now()
-                self.score = SCORES_PER_HINT_USED[self.hints_used]
-                message = "correct"
-
-        if message not in ["solved", "duplicate", "no_attempts"]:
-            session.add(self)
-            session.commit()
-            session.refresh(self)
-
-        return message
-
-
-def get_user_task_trackers(session, user):
-    trackers = session.query(TaskTracker).filter_by(user_id=user).all()
+        # check out the connection first: waiting on the pool while holding the lock
+        # would deadlock against requests that hold a connection and wait for the lock
+        await session.connection()
+        async with tracker_locks.hold((user_id, task.date)):
+            message = await cls._check_attempt(session, user_id, task, text)
+            tracker = await cls.get_daily_task_tracker(user_id, session, task.date)
+            await session.commit()
+        return message, tracker
+
+    @classmethod
+    async def _check_attempt(cls, session: AsyncSession, user_id: str, task: Task, text: str) -> str:
+        tracker = await cls.get_daily_task_tracker(user_id, session, task.date)
+        if tracker.solved:
+            return "solved"
+        if await TaskAttempt.is_duplicate(session, task.date, user_id, text):
+            return "duplicate"
+
+        now = datetime.datetime.now()
+        this_day = (cls.user_id == user_id, cls.date == task.date)
+        created = False
+        if tracker.is_new:
+            created = await cls.ensure(session, user_id, task.date)
+        elif tracker.attempts_left <= 0:
+            if tracker.attempts_reset is not None and now < tracker.attempts_reset:
+                return "no_attempts"
+            await session.exec(
+                update(cls)
+                .where(*this_day, cls.attempts_left <= 0, or_(cls.attempts_reset.is_(None), cls.attempts_reset <= now))
+                .values(attempts_left=ATTEMPTS_PER_RESET, attempts_reset=None)
+            )
+
+        attempts_left = (await session.exec(
+            update(cls)
+            .where(*this_day, ~cls.solved, cls.attempts_left > 0)
+            .values(
+                attempts_left=cls.attempts_left - 1,
+                attempts_total=cls.attempts_total + 1,
+                attempts_reset=case(
+                    (cls.attempts_left <= 1, now + datetime.timedelta(seconds=ATTEMPTS_RESET_SECONDS)),
+                    else_=cls.attempts_reset,
+                ),
+            )
+            .returning(cls.attempts_left)
+        )).scalar()
+        if attempts_left is None:
+            # another worker solved the task or used the last attempt in the meantime
+            tracker = await cls.get_daily_task_tracker(user_id, session, task.date)
+            return "solved" if tracker.solved else "no_attempts"
+
+        correct = task.check_answer(text=text)
+        attempt_log.add(date=task.date, user_id=user_id, text=text, correct=correct, created=now)
+        solved = False
+        if correct:
+            score = (await session.exec(
+                update(cls)
+                .where(*this_day, ~cls.solved)
+                .values(solved=True, time_solved=now, score=case(SCORES_PER_HINT_USED, value=cls.hints_used, else_=0))
+                .returning(cls.score)
+            )).scalar()
+            if solved := score is not None:
+                await UserScore.add_solve(session, user_id, score, task.open_time, now)
+
+        await TaskStats.increment(
+            session, task.date,
+            participants=int(created), attempts=1, wrong_attempts=int(not correct), solves=int(solved),
+        )
+        return "correct" if correct else "incorrect"
+
+
+class TaskAttempt(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    date: datetime.date = Field(nullable=False)
+    user_id: str = Field(foreign_key="user.id", nullable=False)
+    text: str = Field(nullable=False)
+    correct: bool = Field(default=False)
+    created: datetime.datetime = Field(nullable=False)
+
+    __table_args__ = (
+        Index("ix_taskattempt_date_user_text", "date", "user_id", "text", unique=True),
+    )
+
+    @classmethod
+    async def is_duplicate(cls, session: AsyncSession, date: datetime.date, user_id: str, text: str) -> bool:
+        """Whether the user already tried this text on that day.
+
+        Callers hold tracker_locks for the user and day until the attempt is in
+        attempt_log, so a check and its record cannot interleave with another attempt
+        in this worker. The unique key keeps other workers from logging it twice.
+        """
+        if attempt_log.contains(date, user_id, text):
+            return True
+
+        return (await session.exec(
+            select(cls.id).where(cls.date == date, cls.user_id == user_id, cls.text == text).limit(1)
+        )).first() is not None
+
+
+attempt_log = WriteBehindBatcher(
+    TaskAttempt, max_pending=ATTEMPT_LOG_MAX_PENDING, ignore_conflicts=True, key_fields=("date", "user_id", "text"),
+)
+
+
+async def get_user_task_trackers(session: AsyncSession, user):
+    trackers = (await session.exec(select(TaskTracker).filter_by(user_id=user))).all()
     return trackers
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+USER_SCORE_FIELDS = ("id", "username", "full_name", "email", "score", "solved", "hints_used")
+
+
+async def stream_user_scores() -> AsyncIterator[list[tuple]]:
+    """Every user with summed TaskTracker score, solves and hints, in batches from one server-side cursor."""
+    totals = (
+        select(
+            TaskTracker.user_id,
+            func.sum(TaskTracker.score).label("score"),
+            func.sum(case((TaskTracker.solved, 1), else_=0)).label("solved"),
+            func.sum(TaskTracker.hints_used).label("hints_used"),
+        )
+        .group_by(TaskTracker.user_id)
+        .subquery()
+    )
+    statement = (
+        select(
+            User.id, User.username, User.full_name, User.email,
+            func.coalesce(totals.c.score, 0),
+            func.coalesce(totals.c.solved, 0),
+            func.coalesce(totals.c.hints_used, 0),
+        )
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .order_by(User.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE, allow_full_scan=True)
+    )
+
+    async with session_scope() as session:
+        rows = await session.stream(statement)
+        async for batch in rows.partitions():
+            yield batch
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -127,8 +293,32 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     )
 
     if token_data := decode_payload(token):
-        user = User.get_user_by_username_or_email(token_data.username)
+        if STATELESS_TOKENS and token_data.user_id:
+            if token_revocations.is_revoked(token_data.user_id, token_data.issued_at):
+                raise credentials_exception
+            return User(
+                id=token_data.user_id,
+                username=token_data.username,
+                email=token_data.email,
+                full_name=token_data.full_name,
+            )
+
+        if snapshot := user_cache.get(token_data.username):
+            return User(**snapshot)
+        user = await User.get_user_by_username_or_email(session, token_data.username)
         if not user:
             raise credentials_exception
+        # cache plain column values, not the instance: a rollback in any later request
+        # would expire a shared ORM object and leave it unusable outside its session
+        user_cache.set(token_data.username, user.model_dump(exclude={"hashed_password"}))
         return user
     raise credentials_exception
+
+
+async def get_optional_user(token: Annotated[Optional[str], Depends(optional_oauth2_scheme)], session: SessionDep):
+    if token is None:
+        return None
+    return await get_current_user(token, session)
+
+
+UserDashboard.model_rebuild()
@@ -0,0 +1,34 @@
+from typing import Annotated, List, Optional
+
+from fastapi import APIRouter, Query
+from sqlmodel import select
+
+from app.database import SessionDep
+from app.models.job import JobRun
+from app.utils.broadcast import event_hub
+from app.utils.scheduler import task_scheduler
+
+router = APIRouter()
+
+@router.get("/")
+async def get_scheduled_jobs() -> list[dict]:
+    return task_scheduler.jobs()
+
+@router.get("/events/")
+async def get_event_stats() -> dict:
+    return event_hub.stats()
+
+@router.get("/runs/", response_model=List[JobRun])
+async def get_job_runs(
+        session: SessionDep,
+        job: Optional[str] = None,
+        offset: int = 0,
+        limit: Annotated[int, Query(le=100)] = 100,
+) -> list:
+    statement = select(JobRun)
+    if job is not None:
+        statement = statement.where(JobRun.job == job)
+    runs = (await session.exec(
+        statement.order_by(JobRun.id.desc()).offset(offset).limit(limit).execution_options(allow_full_scan=True)
+    )).all()
+    return runs
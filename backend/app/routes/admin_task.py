@@ -1,72 +1,135 @@
 import datetime
-from typing import Annotated, List
+import json
+from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request, BackgroundTasks
+from sqlalchemy import delete
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 from starlette import status
+from starlette.responses import StreamingResponse
 
-from app.database import session_scope
-from app.schemas.task import TaskCreate, TaskUpdate, TaskHintCreate, TaskAdminRead
-from app.models.task import Task, TaskHint, TaskAnswer, create_or_update_task
+from app.database import SessionDep
+from app.schemas.task import TaskCreate, TaskUpdate, TaskHintCreate, TaskAdminRead, TaskStatsRead
+from app.models.media import TaskMedia, TaskMediaVariant
+from app.models.season import read_season, import_season, export_season
+from app.models.stats import get_task_stats
+from app.models.task import Task, TaskHint, TaskAnswer, create_or_update_task, daily_task, public_tasks, calendar_cache
 from app.schemas.user import UserRead
 from app.models.user import User, TaskTracker
+from app.utils.broadcast import event_hub
 from app.utils.encryption import enigma
+from app.utils.input import iter_lines
+from app.utils.time import get_open_close_time
+from app.utils.media_store import media_store
+from app.utils.scheduler import task_scheduler
+from app.routes.media import generate_variants
 
 router = APIRouter()
 
+@router.post("/import/")
+async def import_tasks(request: Request, session: SessionDep, background_tasks: BackgroundTasks, replace: bool = False):
+    tasks = await read_season(iter_lines(request.stream()))
+    if not tasks:
+        raise HTTPException(status_code=422, detail="No tasks in import")
+
+    result = await import_season(session, tasks, replace)
+
+    for task in tasks:
+        enigma.forget_matcher(task.date)
+        daily_task.invalidate(task.date)
+        public_tasks.invalidate(task.date)
+        media_store.forget_date(task.date)
+        task_scheduler.schedule_task(
+            task.date, get_open_close_time(task.date, task.open_time), get_open_close_time(task.date, task.close_time)
+        )
+        for media in task.media:
+            if media.media_type.startswith("image/"):
+                background_tasks.add_task(generate_variants, TaskMedia(date=task.date, **media.model_dump()))
+    calendar_cache.invalidate()
+
+    return result
+
+
+@router.get("/export/")
+async def export_tasks(start: Optional[datetime.date] = None, end: Optional[datetime.date] = None):
+    return StreamingResponse(
+        export_season(start, end),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="season.ndjson"'},
+    )
+
+
 @router.get("/{date}/", response_model=TaskAdminRead)
-async def get_task(date: datetime.date) -> dict:
-    with session_scope() as session:
-        if task := session.exec(select(Task).where(Task.date == date)).first():
-            return task.get_admin_task()
-        else:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+async def get_task(date: datetime.date, session: SessionDep) -> dict:
+    if task := await Task.get_task(session, date):
+        return task.get_admin_task()
+    else:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
 
 
 @router.post("/{date}/", response_model=TaskAdminRead)
-async def create_task(date: datetime.date, new_task: TaskCreate) -> TaskAdminRead:
+async def create_task(date: datetime.date, new_task: TaskCreate, session: SessionDep) -> TaskAdminRead:
     if new_task.open_time >= new_task.close_time:
         raise HTTPException(status_code=422, detail="close time must be after open time")
 
-    return create_or_update_task(new_task, date)
+    task = await create_or_update_task(session, new_task, date)
+    task_scheduler.schedule_task(date, task.open_time, task.close_time)
+    return task
 
 
 @router.patch("/{date}/", response_model=TaskAdminRead)
-async def update_task(date: datetime.date, updated_task: TaskUpdate) -> TaskAdminRead:
-    return create_or_update_task(updated_task, date)
+async def update_task(date: datetime.date, updated_task: TaskUpdate, session: SessionDep) -> TaskAdminRead:
+    task = await create_or_update_task(session, updated_task, date)
+    task_scheduler.schedule_task(date, task.open_time, task.close_time)
+    return task
 
 @router.delete("/{date}/", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_task(date: str = datetime.date.today()):
-    with session_scope() as session:
-        if task := session.exec(select(Task).where(Task.date == date)).first():
-            session.delete(task)
-            session.commit()
-        else:
-            raise HTTPException(status_code=404, detail="Task not found")
+async def delete_task(session: SessionDep, date: str = datetime.date.today()):
+    if task := await Task.get_task(session, date):
+        await session.exec(delete(TaskMediaVariant).where(
+            TaskMediaVariant.file_name.in_([media.file_name for media in task.media])
+        ))
+        await session.delete(task)
+        await session.commit()
+        enigma.forget_matcher(task.date)
+        daily_task.invalidate(task.date)
+        public_tasks.invalidate(task.date)
+        calendar_cache.invalidate()
+        media_store.forget_date(task.date)
+        task_scheduler.unschedule_task(task.date)
+    else:
+        raise HTTPException(status_code=404, detail="Task not found")
 
 @router.get("/{date}/hint/")
-async def get_task_hint(date: datetime.date = datetime.date.today()):
-    with session_scope() as session:
-        task = session.exec(select(Task).where(Task.date == date)).first()
-        if task:
-            return task.hints
-        else:
-            raise HTTPException(status_code=404, detail="Task not found")
+async def get_task_hint(session: SessionDep, date: datetime.date = datetime.date.today()):
+    task = await Task.get_task(session, date)
+    if task:
+        return task.hints
+    else:
+        raise HTTPException(status_code=404, detail="Task not found")
 
 @router.post("/{date}/hint/", response_model=TaskHint)
-async def add_task_hint(hint: TaskHintCreate, date: datetime.date):
-    with session_scope() as session:
-        task = session.exec(select(Task).where(Task.date == date)).first()
-        if task:
-            if len(task.hints) >= 5:
-                raise HTTPException(status_code=400, detail="Too many hints")
-            number_of_hints = len(task.hints) + 1
-            new_hint = hint.model_dump()
-            new_hint["date"] = date
-            new_hint["hint_number"] = number_of_hints
-            session.add(TaskHint(**new_hint))
-            session.commit()
-            return TaskHint(**new_hint)
-        else:
-            raise HTTPException(status_code=404, detail="Task not found")
+async def add_task_hint(hint: TaskHintCreate, date: datetime.date, session: SessionDep):
+    task = await Task.get_task(session, date)
+    if task:
+        if len(task.hints) >= 5:
+            raise HTTPException(status_code=400, detail="Too many hints")
+        number_of_hints = len(task.hints) + 1
+        new_hint = hint.model_dump()
+        new_hint["date"] = date
+        new_hint["hint_number"] = number_of_hints
+        session.add(TaskHint(**new_hint))
+        await session.commit()
+        daily_task.invalidate(date)
+        if task.status == "open":
+            event_hub.publish("hint", json.dumps({"date": date.isoformat(), "hint_number": number_of_hints}))
+        return TaskHint(**new_hint)
+    else:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+@router.get("/{date}/stats/", response_model=TaskStatsRead)
+async def get_task_statistics(date: datetime.date, session: SessionDep):
+    if not (task := await session.get(Task, date)):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return await get_task_stats(session, date, task.open_time)
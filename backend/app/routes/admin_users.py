@@ -1,48 +1,94 @@
-from typing import Annotated, List
+import csv
+import io
+import json
+from typing import Annotated, List, Literal, Optional
 
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Response
 from sqlmodel import select
 from starlette import status
+from starlette.responses import StreamingResponse
 
-from app.database import session_scope
+from app.database import SessionDep
+from app.models.leaderboard import rebuild_leaderboard
 from app.schemas.task import TaskCreate
 from app.models.task import Task, TaskAnswer
 from app.schemas.user import UserRead
-from app.models.user import User, TaskTracker
+from app.models.user import User, TaskTracker, user_cache, stream_user_scores, USER_SCORE_FIELDS
 from app.utils.encryption import enigma
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserRead])
 async def get_users(
-        offset: int = 0,
+        session: SessionDep,
+        response: Response,
+        after: Optional[str] = None,
         limit: Annotated[int, Query(le=100)] = 100,
     ) -> list:
-    with session_scope() as session:
-        users = session.exec(select(User).offset(offset).limit(limit)).all()
+    statement = select(User).order_by(User.id).limit(limit)
+    if after is not None:
+        statement = statement.where(User.id > after)
+    users = (await session.exec(statement)).all()
+
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = users[-1].id
     return users
 
+@router.get("/export/")
+async def export_users(format: Literal["csv", "ndjson"] = "csv"):
+    if format == "csv":
+        return StreamingResponse(
+            export_users_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+        )
+    return StreamingResponse(
+        export_users_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
+
+async def export_users_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(USER_SCORE_FIELDS)
+    async for batch in stream_user_scores():
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def export_users_ndjson():
+    async for batch in stream_user_scores():
+        yield "".join(json.dumps(dict(zip(USER_SCORE_FIELDS, row))) + "\n" for row in batch).encode()
+
+@router.get("/cache/")
+async def get_user_cache_stats() -> dict:
+    return user_cache.stats()
+
+@router.post("/scores/rebuild/")
+async def rebuild_user_scores(session: SessionDep) -> dict:
+    return {"users": await rebuild_leaderboard(session)}
+
 @router.get("/{user_id}/", response_model=UserRead)
 async def get_user_by_id(
     user_id: str,
+    session: SessionDep,
 ) -> User:
-    with session_scope() as session:
-        user = session.exec(select(User).where(User.id == user_id)).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        return user
+    return user
 
 @router.get("/{user_id}/task/")
-async def get_user_task(user_id: str) -> "TaskTracker":
-    if not await get_user_by_id(user_id):
+async def get_user_task(user_id: str, session: SessionDep) -> "TaskTracker":
+    if not await get_user_by_id(user_id, session):
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_task = TaskTracker.get_or_create_daily_task_tracker(user_id)
-    with session_scope() as session:
-        session.add(user_task)
-        session.commit()
-        session.refresh(user_task)
+    user_task = await TaskTracker.get_daily_task_tracker(user_id=user_id, session=session)
     return user_task
 
 
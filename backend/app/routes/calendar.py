@@ -0,0 +1,42 @@
+import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Header
+from fastapi.params import Depends
+from pydantic import TypeAdapter
+from sqlmodel import select
+from starlette.responses import Response
+
+from app.database import SessionDep
+from app.models.task import calendar_cache
+from app.models.user import User, TaskTracker, get_optional_user
+from app.schemas.task import CalendarRead, CalendarResult
+from app.utils.cache import body_etag, etag_matches
+
+router = APIRouter()
+
+results_adapter = TypeAdapter(dict[datetime.date, CalendarResult])
+
+
+@router.get("", response_model=CalendarRead)
+async def get_calendar(
+        session: SessionDep,
+        user: Annotated[Optional[User], Depends(get_optional_user)],
+        if_none_match: Annotated[Optional[str], Header()] = None,
+):
+    days, etag = await calendar_cache.get(session)
+
+    if user is None:
+        body = b'{"days":' + days + b'}'
+    else:
+        trackers = (await session.exec(select(TaskTracker).where(TaskTracker.user_id == user.id))).all()
+        results = results_adapter.dump_json({
+            tracker.date: CalendarResult.model_validate(tracker, from_attributes=True) for tracker in trackers
+        })
+        body = b'{"days":' + days + b',"results":' + results + b'}'
+        etag = body_etag(body)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Authorization"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,32 @@
+import datetime
+import json
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Header
+from starlette.responses import StreamingResponse
+
+from app.database import session_scope
+from app.models.task import daily_task
+from app.schemas.task import TaskStatusRead
+from app.utils.broadcast import event_hub, encode_event
+
+router = APIRouter()
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.get("")
+async def get_events(last_event_id: Annotated[Optional[int], Header()] = None):
+    async with session_scope() as session:
+        task = await daily_task.get(session)
+
+    initial = encode_event("time", json.dumps({"time": datetime.datetime.now().isoformat()}))
+    if task is not None:
+        initial += encode_event("status", TaskStatusRead(status=task.status, **task.model_dump()).model_dump_json())
+
+    return StreamingResponse(
+        event_hub.subscribe(last_event_id, initial),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
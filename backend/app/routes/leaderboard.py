@@ -0,0 +1,77 @@
+import datetime
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.params import Depends
+from sqlmodel import select
+
+from app.database import SessionDep
+from app.models.leaderboard import UserScore, DailyResult
+from app.models.user import User, TaskTracker, get_current_user
+from app.schemas.leaderboard import LeaderboardEntry, DailyLeaderboardEntry
+
+router = APIRouter()
+
+
+@router.get("/", response_model=list[LeaderboardEntry])
+async def get_leaderboard(
+        session: SessionDep,
+        offset: int = 0,
+        limit: Annotated[int, Query(le=100)] = 100,
+) -> list:
+    rows = (await session.exec(
+        select(UserScore, User.username)
+        .join(User, User.id == UserScore.user_id)
+        .order_by(UserScore.score.desc(), UserScore.time_total)
+        .offset(offset)
+        .limit(limit)
+    )).all()
+
+    return [
+        LeaderboardEntry(rank=offset + i + 1, username=username, **entry.model_dump())
+        for i, (entry, username) in enumerate(rows)
+    ]
+
+
+@router.get("/me", response_model=LeaderboardEntry)
+async def get_my_rank(
+        user: Annotated[User, Depends(get_current_user)],
+        session: SessionDep,
+):
+    if not (rank := await UserScore.get_rank(session, user.id)):
+        raise HTTPException(status_code=404, detail="No solved tasks")
+
+    entry = await session.get(UserScore, user.id)
+    return LeaderboardEntry(rank=rank, username=user.username, **entry.model_dump())
+
+
+@router.get("/{date}", response_model=list[DailyLeaderboardEntry])
+async def get_daily_leaderboard(
+        date: datetime.date,
+        session: SessionDep,
+        offset: int = 0,
+        limit: Annotated[int, Query(le=100)] = 100,
+) -> list:
+    frozen = (await session.exec(
+        select(DailyResult, User.username)
+        .join(User, User.id == DailyResult.user_id)
+        .where(DailyResult.date == date, DailyResult.rank > offset)
+        .order_by(DailyResult.rank)
+        .limit(limit)
+    )).all()
+    if frozen:
+        return [DailyLeaderboardEntry(username=username, **result.model_dump()) for result, username in frozen]
+
+    rows = (await session.exec(
+        select(TaskTracker, User.username)
+        .join(User, User.id == TaskTracker.user_id)
+        .where(TaskTracker.date == date, TaskTracker.solved)
+        .order_by(TaskTracker.score.desc(), TaskTracker.time_solved)
+        .offset(offset)
+        .limit(limit)
+    )).all()
+
+    return [
+        DailyLeaderboardEntry(rank=offset + i + 1, username=username, **tracker.model_dump())
+        for i, (tracker, username) in enumerate(rows)
+    ]
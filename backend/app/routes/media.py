@@ -1,57 +1,140 @@
+import asyncio
 import datetime
 import os
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, HTTPException, UploadFile
-from fastapi.params import Depends
+from fastapi import APIRouter, HTTPException, Header, BackgroundTasks, Request
 from sqlmodel import select
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, Response
 
-from app.database import session_scope
-from app.models.media import TaskMedia
-from app.models.task import Task
-from app.models.user import User, get_current_user
+from app.database import SessionDep, session_scope
+from app.models.media import TaskMedia, TaskMediaVariant, MediaTypes
+from app.models.task import Task, daily_task, public_tasks
+from app.settings import IMAGE_VARIANT_WIDTHS, MEDIA_MAX_UPLOAD_BYTES, MEDIA_URL_TTL
+from app.utils.cache import etag_matches
+from app.utils.images import make_variants, makes_variants, variant_pool
+from app.utils.media_store import MediaEntry, media_store, etag_for, FileTooLarge
+from app.utils.security import verify_media_signature
+from app.utils.uploads import receive_file, UnsupportedFileType, UploadError
 
 router = APIRouter()
 
+# signed URLs gate access per user and expire, so shared caches must not keep the file
+# and the browser must not outlive the signature
+CACHE_CONTROL = f"private, max-age={MEDIA_URL_TTL}"
+# media of an expired task is open to everyone and its file name is its content hash
+PUBLIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-@router.post("/upload/")
-async def upload_file(file: UploadFile, date: datetime.date, hint_number: int = 0):
-    files_dir = "..\\files"
-    os.makedirs(files_dir, exist_ok=True)
-    task_media = TaskMedia.create_media_dict(file, date, hint_number)
-    file_path = os.path.join(files_dir, task_media.file_name)
 
-    with session_scope() as session:
-        if Task.get_task(session, date) is None:
-            raise HTTPException(400, detail=f'Task on date {date} does not exist')
-        with open(file_path, "wb") as f:
-            while contents := await file.read(1024 * 1024):
-                f.write(contents)
-        session.add(task_media)
-        session.commit()
-        session.refresh(task_media)
+async def generate_variants(task_media: TaskMedia):
+    stem = task_media.file_name.rsplit(".", 1)[0]
+    rows = await asyncio.get_running_loop().run_in_executor(
+        variant_pool, make_variants,
+        media_store.path(task_media.file_name), media_store.root, stem, task_media.media_type, IMAGE_VARIANT_WIDTHS,
+    )
+    if not rows:
+        return
 
+    variants = [TaskMediaVariant(file_name=task_media.file_name, **row) for row in rows]
+    async with session_scope() as session:
+        for variant in variants:
+            await session.merge(variant)
+        await session.commit()
+    media_store.remember(task_media, variants)
+
+
+# the form is read by receive_file rather than by FastAPI, so describe it here
+UPLOAD_FORM = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+
+@router.post("/upload/", openapi_extra=UPLOAD_FORM)
+async def upload_file(
+        request: Request,
+        date: datetime.date,
+        session: SessionDep,
+        background_tasks: BackgroundTasks,
+        hint_number: int = 0,
+):
+    if await session.get(Task, date) is None:
+        raise HTTPException(400, detail=f'Task on date {date} does not exist')
+    # end the read transaction so no connection is held while the file is written
+    await session.commit()
+
+    try:
+        upload = await receive_file(
+            media_store, request.headers.get("content-type", ""), request.stream(), "file",
+            MEDIA_MAX_UPLOAD_BYTES, MediaTypes.__members__,
+        )
+    except UnsupportedFileType as e:
+        raise HTTPException(415, detail=str(e))
+    except FileTooLarge as e:
+        raise HTTPException(413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(400, detail=str(e))
+    file_name = upload.file_name
+
+    if task_media := await session.get(TaskMedia, file_name):
+        if task_media.date != date or task_media.hint_number != hint_number:
+            raise HTTPException(409, detail=f'File already uploaded for {task_media.date}')
         return task_media
 
+    task_media = TaskMedia.create_media_dict(upload, file_name, date, hint_number)
+    session.add(task_media)
+    await session.commit()
+    await session.refresh(task_media)
+    media_store.remember(task_media)
+    daily_task.invalidate(date)
+    public_tasks.invalidate(date)
+    background_tasks.add_task(generate_variants, task_media)
+
+    return task_media
+
 
 @router.get("/download/{file_name}")
 async def download_file(
         file_name: str,
-        # user: Annotated[User, Depends(get_current_user)],
+        session: SessionDep,
+        uid: Optional[str] = None,
+        exp: Optional[int] = None,
+        sig: Optional[str] = None,
+        size: Optional[int] = None,
+        accept: Annotated[str, Header()] = "",
+        if_none_match: Annotated[Optional[str], Header()] = None,
 ):
-    with session_scope() as session:
-        media = session.exec(select(TaskMedia).where(TaskMedia.file_name == file_name)).first()
+    signed = None not in (uid, exp, sig) and verify_media_signature(file_name, uid, exp, sig)
 
-        if not media:
-            raise HTTPException(status_code=404, detail="File not found")
+    if not (media := media_store.lookup(file_name)):
+        if not (task_media := await session.get(TaskMedia, file_name)):
+            raise HTTPException(status_code=404 if signed else 403, detail="File not found")
+        variants = (await session.exec(
+            select(TaskMediaVariant).where(TaskMediaVariant.file_name == file_name)
+        )).all()
+        if variants or not makes_variants(task_media.media_type):
+            media = media_store.remember(task_media, variants)
+        else:
+            # the worker that took the upload may still be making them: serve the
+            # original now and look again on the next request instead of caching "none"
+            media = MediaEntry.from_media(task_media)
 
-        # if media.is_locked(user, session):
-        #     raise HTTPException(status_code=403, detail="File not accessible")
-
-    files_dir = "..\\files"
-    file_path = os.path.join(files_dir, file_name)
-    if not os.path.exists(file_path):
-        return HTTPException(status_code=404, detail="File not found")
+    if signed:
+        cache_control = CACHE_CONTROL
+    elif await public_tasks.status(session, media.date) == "expired":
+        cache_control = PUBLIC_CACHE_CONTROL
     else:
-        return FileResponse(file_path, media_type=media.media_type)
+        raise HTTPException(status_code=403, detail="File not accessible")
+
+    served_file, media_type = media.pick(size, accept)
+    headers = {"ETag": etag_for(served_file), "Cache-Control": cache_control}
+    if media.variants:
+        headers["Vary"] = "Accept"
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    file_path = media_store.path(served_file)
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=stat_result)
@@ -1,100 +1,111 @@
 import datetime
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
 from fastapi.params import Depends
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select, and_
+from starlette.responses import Response
 
-from app.database import session_scope
-from app.models.task import Task, TaskHint
+from app.database import SessionDep
+from app.models.task import Task, daily_task, public_tasks
 from app.models.user import User, TaskTracker, get_current_user
-from app.schemas.task import TaskUserRead
+from app.schemas.task import TaskUserRead, TaskHintRead, TaskMediaRead
 from app.schemas.user import UserAnswerReply
+from app.utils.admission import attempt_gate
+from app.utils.cache import etag_matches
 
 router = APIRouter()
 
 
-async def get_current_task():
-    with session_scope() as session:
-        task = Task.get_task(session)
+async def get_current_task(session: SessionDep):
+    task = await daily_task.get(session)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    if not task.status == "active":
+    if not task.status == "open":
         raise HTTPException(status_code=403, detail="No active task")
     return task
 
 
-@router.get("/{date}", response_model=TaskUserRead)
-async def get_task_by_date(date: datetime.date = datetime.date.today()):
-    with session_scope() as session:
-        if task := Task.get_task(session=session, date=date):
-            return TaskUserRead(**task.get_admin_task().model_dump())
-        raise HTTPException(404, "Task not found")
+def raise_rejected_attempt(reason: str, answer: str, attempts_reset: Optional[datetime.datetime]):
+    if reason == "duplicate":
+        raise HTTPException(status_code=400, detail={
+            "type": "duplicate",
+            "message": "input is a duplicate from previous attempt",
+            "input": answer
+        })
+    raise HTTPException(status_code=429, detail={"type": "attempt", "time": attempts_reset.isoformat()})
 
 
 @router.post("/answer", response_model=UserAnswerReply)
 async def answer_task(
         user: Annotated[User, Depends(get_current_user)],
         task: Annotated[Task, Depends(get_current_task)],
+        session: SessionDep,
         answer: str
 ):
+    answer_txt = answer.strip().lower()
+    if rejection := attempt_gate.check(user.id, task.date, answer_txt):
+        raise_rejected_attempt(rejection, answer, attempt_gate.get_reset(user.id))
+
     try:
-        with session_scope() as session:
-            task_tracker = TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session)
-            answer_txt = answer.strip().lower()
-            attempt_result = task_tracker.check_attempt(text=answer_txt, task=task, session=session)
-
-            if attempt_result == "duplicate":
-                raise HTTPException(status_code=400, detail={
-                    "type": "duplicate",
-                    "message": "input is a duplicate from previous attempt",
-                    "input": answer
-                })
-            elif attempt_result == "no_attempts":
-                raise HTTPException(status_code=429,
-                                    detail={"type": "attempt", "time": task_tracker.attempts_reset.isoformat()})
-            else:
-                answer_reply = UserAnswerReply(message=attempt_result, text=answer_txt, **task_tracker.model_dump())
-                return answer_reply
+        attempt_result, task_tracker = await TaskTracker.attempt(session, user.id, task, answer_txt)
+        attempt_gate.record(task_tracker, answer_txt if attempt_result != "no_attempts" else None)
+
+        if attempt_result in ["duplicate", "no_attempts"]:
+            raise_rejected_attempt(attempt_result, answer, task_tracker.attempts_reset)
+        else:
+            answer_reply = UserAnswerReply(message=attempt_result, text=answer_txt, **task_tracker.model_dump())
+            return answer_reply
 
     except IntegrityError:
         raise HTTPException(status_code=404, detail="User not found")
 
 
-@router.get("/hint", response_model=list[Optional[TaskHint]])
-async def get_user_hint(
+@router.get("/media", response_model=list[TaskMediaRead])
+async def get_user_media(
         user: Annotated[User, Depends(get_current_user)],
-        task: Annotated[Task, Depends(get_current_task)]
+        task: Annotated[Task, Depends(get_current_task)],
+        session: SessionDep,
 ):
-    with session_scope() as session:
-        task_tracker = TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session)
-        if task_tracker.solved:
-            return task.hints
+    task_tracker = await TaskTracker.get_daily_task_tracker(user_id=user.id, session=session)
+    return task.get_unlocked_media(task_tracker, user.id)
 
-        hints = session.exec(
-            select(TaskHint)
-            .where(and_(
-                TaskHint.date == task_tracker.date,
-                TaskHint.hint_number <= task_tracker.hints_used
-            ))
-        ).all()
 
-        return hints
+@router.get("/hint", response_model=list[Optional[TaskHintRead]])
+async def get_user_hint(
+        user: Annotated[User, Depends(get_current_user)],
+        task: Annotated[Task, Depends(get_current_task)],
+        session: SessionDep,
+):
+    task_tracker = await TaskTracker.get_daily_task_tracker(user_id=user.id, session=session)
+    return task.get_unlocked_hints(task_tracker, user.id)
 
 
 @router.post("/hint/unlock", status_code=204)
 async def unlock_user_hint(
         user: Annotated[User, Depends(get_current_user)],
         task: Annotated[Task, Depends(get_current_task)],
+        session: SessionDep,
 ):
-    with session_scope() as session:
-        task_tracker = TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session)
-        if task_tracker.solved:
-            raise HTTPException(status_code=400, detail="Task is already solved")
-        if task_tracker.hints_used >= len(task.hints):
-            raise HTTPException(status_code=400, detail={"type": "hint", "message": "no hints left"})
-        else:
-            task_tracker.hints_used += 1
-            session.add(task_tracker)
-            session.commit()
+    unlocked, task_tracker = await TaskTracker.unlock_hint(session, user.id, task.date, len(task.hints))
+    if unlocked:
+        return
+    if task_tracker.solved:
+        raise HTTPException(status_code=400, detail="Task is already solved")
+    raise HTTPException(status_code=400, detail={"type": "hint", "message": "no hints left"})
+
+
+@router.get("/{date}", response_model=TaskUserRead)
+async def get_task_by_date(
+        session: SessionDep,
+        date: datetime.date = datetime.date.today(),
+        if_none_match: Annotated[Optional[str], Header()] = None,
+):
+    if not (cached := await public_tasks.get(session, date)):
+        raise HTTPException(404, "Task not found")
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
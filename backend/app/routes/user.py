@@ -1,8 +1,12 @@
+import datetime
+
 from fastapi import APIRouter, HTTPException
 from sqlalchemy.exc import IntegrityError
 
-from app.database import session_scope
-from app.schemas.user import UserCreate, UserRead
+from app.database import SessionDep
+from app.models.leaderboard import UserScore
+from app.models.task import daily_task
+from app.schemas.user import UserCreate, UserRead, UserDashboard
 from app.models.user import User, TaskTracker, get_user_task_trackers, get_current_user
 
 from typing import Annotated
@@ -11,21 +15,20 @@ from fastapi.params import Depends
 router = APIRouter()
 
 @router.post("/", response_model=UserRead)
-async def create_user(user: UserCreate):
-    with session_scope() as session:
-        new_user = User.create_user(user)
-        try:
-            session.add(new_user)
-            session.commit()
-            session.refresh(new_user)
-        except IntegrityError as e:
-            session.rollback()
-            detail = "duplicate_user"
-            if "user.email" in str(e):
-                detail = "duplicate_email"
-            exception = HTTPException(status_code=409, detail=detail)
-            raise exception
-        return new_user
+async def create_user(user: UserCreate, session: SessionDep):
+    new_user = await User.create_user(user)
+    try:
+        session.add(new_user)
+        await session.commit()
+        await session.refresh(new_user)
+    except IntegrityError as e:
+        await session.rollback()
+        detail = "duplicate_user"
+        if "email" in str(e.orig):
+            detail = "duplicate_email"
+        exception = HTTPException(status_code=409, detail=detail)
+        raise exception
+    return new_user
 
 
 @router.get("/", response_model=UserRead)
@@ -37,15 +40,37 @@ async def read_current_user(
 @router.get("/results/", response_model=list[TaskTracker])
 async def get_my_results(
     user: Annotated[User, Depends(get_current_user)],
+    session: SessionDep,
 ):
-    with session_scope() as session:
-        all_tasks = get_user_task_trackers(session, user.id)
-        return all_tasks
+    all_tasks = await get_user_task_trackers(session, user.id)
+    return all_tasks
 
 @router.get("/results/today", response_model=TaskTracker)
 async def get_result_today(
-        user: Annotated[User, Depends(get_current_user)]
+        user: Annotated[User, Depends(get_current_user)],
+        session: SessionDep,
+):
+    task = await TaskTracker.get_daily_task_tracker(user_id=user.id, session=session)
+    return task
+
+@router.get("/dashboard", response_model=UserDashboard)
+async def get_dashboard(
+        user: Annotated[User, Depends(get_current_user)],
+        session: SessionDep,
 ):
-    with session_scope() as session:
-        task = TaskTracker.get_or_create_daily_task_tracker(user_id=user.id, session=session)
-        return task
\ No newline at end of file
+    today = datetime.date.today()
+    trackers = await get_user_task_trackers(session, user.id)
+    today_tracker = next((t for t in trackers if t.date == today), None) or TaskTracker(user_id=user.id, date=today)
+    user_score = await session.get(UserScore, user.id)
+
+    task = await daily_task.get(session)
+    hints = task.get_unlocked_hints(today_tracker, user.id) if task and task.status == "open" else []
+
+    return UserDashboard(
+        user=UserRead.model_validate(user, from_attributes=True),
+        results=trackers,
+        today=today_tracker,
+        hints=hints,
+        score=user_score.score if user_score else 0,
+        solved=user_score.solved if user_score else 0,
+    )
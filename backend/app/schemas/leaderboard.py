@@ -0,0 +1,22 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    username: str
+    score: int
+    solved: int
+    time_total: int
+
+
+class DailyLeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    username: str
+    score: int
+    hints_used: int
+    time_solved: Optional[datetime.datetime]
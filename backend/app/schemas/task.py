@@ -6,7 +6,6 @@ from typing import Optional, List, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from app.models.task import TaskHint, TaskAnswer
-    from app.models.media import TaskMedia
 
 
 class TaskCreate(pydantic.BaseModel):
@@ -29,17 +28,93 @@ class TaskUserRead(pydantic.BaseModel):
     date: datetime.date
     open_time: datetime.datetime
     close_time: datetime.datetime
-    info: str
+    info: Optional[str] = None
+    status: str
+    media: List['TaskMediaRead'] = []
+
+class TaskStatusRead(pydantic.BaseModel):
+    date: datetime.date
+    open_time: datetime.datetime
+    close_time: datetime.datetime
     status: str
 
+class CalendarDay(TaskStatusRead):
+    info: Optional[str] = None
+
+class CalendarResult(pydantic.BaseModel):
+    solved: bool
+    score: int
+    hints_used: int
+    attempts_total: int
+    time_solved: Optional[datetime.datetime]
+
+class CalendarRead(pydantic.BaseModel):
+    days: List[CalendarDay]
+    results: Optional[dict[datetime.date, CalendarResult]] = None
+
 class TaskAdminRead(TaskUserRead):
     answer_plaintext: str
     answer: 'TaskAnswer'
     hints: Optional[List['TaskHint']] = None
-    media: Optional[List['TaskMedia']] = None
+    media: Optional[List['TaskMediaRead']] = None
+
+
+class TaskMediaRead(pydantic.BaseModel):
+    file_name: str
+    hint_number: int
+    media_type: str
+    description: Optional[str]
+    url: str
+
+class TaskHintRead(pydantic.BaseModel):
+    date: datetime.date
+    info: Optional[str]
+    hint_number: int
+    media: List[TaskMediaRead] = []
 
 
 class TaskHintCreate(pydantic.BaseModel):
     info: Optional[str]
 
 
+class TaskMediaImport(pydantic.BaseModel):
+    file_name: str
+    hint_number: int = pydantic.Field(default=0, ge=0, le=5)
+    media_type: str
+    description: Optional[str] = None
+
+class TaskImport(TaskCreate):
+    date: datetime.date
+    author: Optional[str] = None
+    answer: Optional[str] = None
+    answer_encrypted: Optional[str] = None
+    yt_url: Optional[HttpUrl] = None
+    hints: List[TaskHintCreate] = pydantic.Field(default=[], max_length=5)
+    media: List[TaskMediaImport] = []
+
+    @pydantic.model_validator(mode="after")
+    def check_import(self):
+        if (self.answer is None) == (self.answer_encrypted is None):
+            raise ValueError("exactly one of answer and answer_encrypted is required")
+        if self.open_time >= self.close_time:
+            raise ValueError("close time must be after open time")
+        return self
+
+
+class WrongAnswerCount(pydantic.BaseModel):
+    text: str
+    count: int
+
+class TaskStatsRead(pydantic.BaseModel):
+    date: datetime.date
+    frozen: bool
+    participants: int
+    attempts: int
+    wrong_attempts: int
+    solves: int
+    solve_rate: float
+    hints_unlocked: int
+    median_seconds_to_solve: Optional[int]
+    attempts_per_solver: Optional[float]
+    hint_distribution: dict[int, int]
+    top_wrong_answers: List[WrongAnswerCount]
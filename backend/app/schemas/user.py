@@ -1,8 +1,13 @@
 import datetime
-from typing import Optional
+from typing import Optional, List, TYPE_CHECKING
 
 from pydantic import BaseModel
 
+from app.schemas.task import TaskHintRead
+
+if TYPE_CHECKING:
+    from app.models.user import TaskTracker
+
 
 class UserCreate(BaseModel):
     email: str
@@ -32,4 +37,13 @@ class UserAnswerReply(UserAnswerAttempt):
     hints_used: int
     attempts_left: int
     attempts_reset: Optional[datetime.datetime]
-    attempts: list[str]
+    attempts_total: int
+
+
+class UserDashboard(BaseModel):
+    user: UserRead
+    results: List['TaskTracker']
+    today: 'TaskTracker'
+    hints: List[TaskHintRead]
+    score: int
+    solved: int
@@ -1,5 +1,5 @@
 import dotenv
-from os import environ
+from os import environ, path
 
 dotenv_file = dotenv.find_dotenv()
 print(dotenv_file)
@@ -11,7 +11,52 @@ def get_env_var(var_name, default=None):
 
 JULEKALENDER_ANSWER_KEY=get_env_var("ANSWER_KEY").encode("utf-8")
 
+DB_URL = get_env_var("DB_URL", "sqlite+aiosqlite:///test.db")
+DB_POOL_SIZE = int(get_env_var("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(get_env_var("DB_MAX_OVERFLOW", 10))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": get_env_var("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": get_env_var("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(get_env_var("SQLITE_BUSY_TIMEOUT", 5000)),
+    "cache_size": int(get_env_var("SQLITE_CACHE_SIZE", -64000)),
+    "mmap_size": int(get_env_var("SQLITE_MMAP_SIZE", 268435456)),
+}
+
+QUERY_PLAN_CHECK = get_env_var("QUERY_PLAN_CHECK", "0") == "1"
+
 ATTEMPTS_PER_RESET = 10
+ATTEMPTS_RESET_SECONDS = 30
+ATTEMPT_LOG_MAX_PENDING = int(get_env_var("ATTEMPT_LOG_MAX_PENDING", 10000))
+
+BCRYPT_ROUNDS = int(get_env_var("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(get_env_var("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_QUEUE = int(get_env_var("PASSWORD_HASH_QUEUE", 64))
+
+MEDIA_DIR = get_env_var("MEDIA_DIR", path.join("..", "files"))
+MEDIA_URL_TTL = int(get_env_var("MEDIA_URL_TTL", 900))
+MEDIA_MAX_UPLOAD_BYTES = int(get_env_var("MEDIA_MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+IMAGE_VARIANT_WIDTHS = [int(w) for w in get_env_var("IMAGE_VARIANT_WIDTHS", "160,640,1280").split(",")]
+IMAGE_VARIANT_WORKERS = int(get_env_var("IMAGE_VARIANT_WORKERS", 2))
+
+ENIGMA_WORKERS = int(get_env_var("ENIGMA_WORKERS", 4))
+EXPORT_BATCH_SIZE = int(get_env_var("EXPORT_BATCH_SIZE", 100))
+
+STATELESS_TOKENS = get_env_var("STATELESS_TOKENS", "0") == "1"
+
+USER_CACHE_SIZE = int(get_env_var("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(get_env_var("USER_CACHE_TTL", 300))
+
+EVENT_HISTORY = int(get_env_var("EVENT_HISTORY", 256))
+EVENT_KEEPALIVE_SECONDS = float(get_env_var("EVENT_KEEPALIVE_SECONDS", 15))
+EVENT_RETRY_MS = int(get_env_var("EVENT_RETRY_MS", 5000))
+
+SCHEDULER_ENABLED = get_env_var("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_PREWARM_SECONDS = int(get_env_var("SCHEDULER_PREWARM_SECONDS", 30))
+SCHEDULER_SYNC_SECONDS = int(get_env_var("SCHEDULER_SYNC_SECONDS", 300))
+SCHEDULER_MAINTENANCE_HOUR = int(get_env_var("SCHEDULER_MAINTENANCE_HOUR", 4))
+JOB_HISTORY_DAYS = int(get_env_var("JOB_HISTORY_DAYS", 30))
+JOB_STALE_SECONDS = int(get_env_var("JOB_STALE_SECONDS", 900))
 
 SCORES_PER_HINT_USED = {
     0: 10,
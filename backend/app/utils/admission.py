@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Hashable, Optional
+
+from app.utils.input import string_washer
+
+
+@dataclass
+class AttemptState:
+    solved: bool = False
+    attempts_left: int = 0
+    attempts_reset: Optional[datetime.datetime] = None
+    attempts: set[str] = field(default_factory=set)
+
+
+class AttemptGate:
+    """In-memory mirror of today's TaskTrackers used to reject attempts without a DB round trip.
+
+    The mirror is only ever filled from committed tracker state, so it can lag behind
+    the database but never rejects an attempt the database would accept.
+    """
+
+    def __init__(self):
+        self.date: Optional[datetime.date] = None
+        self._states: dict[str, AttemptState] = {}
+
+    def check(self, user_id: str, date: datetime.date, text: str) -> Optional[str]:
+        if date != self.date or not (state := self._states.get(user_id)):
+            return None
+
+        if state.solved:
+            return None
+        if string_washer(text) in state.attempts:
+            return "duplicate"
+        if state.attempts_left <= 0 and state.attempts_reset is not None:
+            if datetime.datetime.now() < state.attempts_reset:
+                return "no_attempts"
+        return None
+
+    def get_reset(self, user_id: str) -> Optional[datetime.datetime]:
+        if state := self._states.get(user_id):
+            return state.attempts_reset
+        return None
+
+    def record(self, tracker, text: Optional[str] = None):
+        if tracker.date != self.date:
+            self.date = tracker.date
+            self._states.clear()
+
+        state = self._states.setdefault(tracker.user_id, AttemptState())
+        state.solved = tracker.solved
+        state.attempts_left = tracker.attempts_left
+        state.attempts_reset = tracker.attempts_reset
+        if text is not None:
+            state.attempts.add(string_washer(text))
+
+    def forget(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self._states.clear()
+        else:
+            self._states.pop(user_id, None)
+
+
+attempt_gate = AttemptGate()
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, dropped again once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks: dict[Hashable, tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+tracker_locks = KeyedLocks()
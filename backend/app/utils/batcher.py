@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Hashable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.database import dialect_insert, session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBatcher:
+    """Buffers rows for an append-only table and inserts them in batches.
+
+    Rows stay in `pending` until the batch containing them has been written, so
+    readers can consult the buffer for rows that are not in the database yet. Given
+    key_fields, those rows are also counted by key so contains() needs no walk over the
+    buffer. With ignore_conflicts, rows that hit a unique key are skipped instead of
+    failing the batch.
+
+    A batch that fails is retried row by row, and rows that still fail go to
+    `dead_letters` rather than blocking every later batch. Past `max_pending` rows,
+    add() answers 503 so a stalled database cannot grow the buffer without bound.
+    """
+
+    def __init__(self, model, flush_interval: float = 0.005, max_rows: int = 500, max_pending: int = 10000,
+                 ignore_conflicts: bool = False, key_fields: tuple[str, ...] = ()):
+        self.model = model
+        self.ignore_conflicts = ignore_conflicts
+        self.key_fields = key_fields
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.pending: list[dict] = []
+        self._pending_keys: Counter[Hashable] = Counter()
+        self.dead_letters: deque[dict] = deque(maxlen=max_rows)
+        self._wake = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def add(self, **row):
+        if len(self.pending) >= self.max_pending:
+            raise HTTPException(status_code=503, detail="server busy, try again", headers={"Retry-After": "1"})
+
+        self.pending.append(row)
+        if self.key_fields:
+            self._pending_keys[self._key(row)] += 1
+        if len(self.pending) >= self.max_rows:
+            self._wake.set()
+
+    def _key(self, row: dict) -> tuple:
+        return tuple(row[field] for field in self.key_fields)
+
+    def contains(self, *key) -> bool:
+        """Whether a row with these key_fields values is still waiting to be written."""
+        return key in self._pending_keys
+
+    def clear(self):
+        self.pending.clear()
+        self._pending_keys.clear()
+
+    async def insert(self, rows: list[dict]):
+        statement = dialect_insert(self.model).on_conflict_do_nothing() if self.ignore_conflicts else insert(self.model)
+        async with session_scope() as session:
+            await session.exec(statement, params=rows)
+            await session.commit()
+
+    async def flush(self):
+        if not (batch := self.pending[:self.max_rows]):
+            return
+
+        try:
+            await self.insert(batch)
+        except Exception:
+            logger.exception("%s batch of %d rows failed, retrying row by row", self.model.__name__, len(batch))
+            for row in batch:
+                try:
+                    await self.insert([row])
+                except Exception as e:
+                    logger.error("%s row dropped: %r (%r)", self.model.__name__, row, e)
+                    self.dead_letters.append(row)
+        del self.pending[:len(batch)]
+        for key in map(self._key, batch) if self.key_fields else ():
+            self._pending_keys[key] -= 1
+            if not self._pending_keys[key]:
+                del self._pending_keys[key]
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("%s batch flush failed", self.model.__name__)
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        while self.pending:
+            await self.flush()
@@ -0,0 +1,59 @@
+import asyncio
+from collections import deque
+from typing import Optional
+
+from app.settings import EVENT_HISTORY, EVENT_KEEPALIVE_SECONDS, EVENT_RETRY_MS
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def encode_event(event: str, data: str, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode()
+
+
+class BroadcastHub:
+    """Fans server-sent events out to every connected client of this worker.
+
+    Each event is encoded once into a short ring buffer. A subscriber only keeps a
+    cursor into that buffer and waits on one Event shared by all subscribers, so an
+    idle connection costs a suspended generator and nothing per published event.
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY, keepalive: float = EVENT_KEEPALIVE_SECONDS):
+        self.events: deque[tuple[int, bytes]] = deque(maxlen=history)
+        self.last_id = 0
+        self.keepalive = keepalive
+        self.subscribers = 0
+        self._published = asyncio.Event()
+
+    def publish(self, event: str, data: str):
+        self.last_id += 1
+        self.events.append((self.last_id, encode_event(event, data, self.last_id)))
+        self._published.set()
+        self._published = asyncio.Event()
+
+    async def subscribe(self, last_event_id: Optional[int] = None, initial: bytes = b""):
+        cursor = self.last_id if last_event_id is None or last_event_id > self.last_id else last_event_id
+        self.subscribers += 1
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n".encode() + initial
+            while True:
+                published = self._published
+                if cursor < self.last_id:
+                    pending = b"".join(chunk for event_id, chunk in self.events if event_id > cursor)
+                    cursor = self.last_id
+                    yield pending
+                    continue
+                try:
+                    await asyncio.wait_for(published.wait(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> dict:
+        return {"subscribers": self.subscribers, "last_id": self.last_id, "buffered": len(self.events)}
+
+
+event_hub = BroadcastHub()
@@ -1,25 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from cryptography.fernet import Fernet, InvalidToken
 import re
-from app.settings import JULEKALENDER_ANSWER_KEY
+from app.settings import JULEKALENDER_ANSWER_KEY, ENIGMA_WORKERS
 
 class Enigma(Fernet):
     def __init__(self, key):
         super().__init__(key)
+        self._matchers = {}
 
-    def compare_answer(self, txt, ref):
-        try:
-            ref_decrypt = self.decrypt(ref).decode()
-            if isinstance(ref, str):
-                ref = bytes(ref, 'UTF-8')
+    def _build_matcher(self, ref):
+        ref_decrypt = self.decrypt(ref).decode()
 
-            txt = str(txt).lower().strip()
+        if ref_decrypt.startswith("^") and ref_decrypt.endswith("$"):
+            pattern = re.compile(ref_decrypt, re.IGNORECASE)
+            return lambda txt: pattern.search(txt) is not None
 
+        literal = str(ref_decrypt).lower()
+        return lambda txt: literal == txt
 
-            if ref_decrypt.startswith("^") and ref_decrypt.endswith("$"):
-                pattern = re.compile(ref_decrypt, re.IGNORECASE)
-                return pattern.search(txt) is not None
+    def get_matcher(self, ref, key=None):
+        if key is None:
+            return self._build_matcher(ref)
 
-            return str(ref_decrypt).lower() == txt
+        cached = self._matchers.get(key)
+        if cached is None or cached[0] != ref:
+            cached = (ref, self._build_matcher(ref))
+            self._matchers[key] = cached
+        return cached[1]
+
+    def forget_matcher(self, key):
+        self._matchers.pop(key, None)
+
+    def compare_answer(self, txt, ref, key=None):
+        try:
+            txt = str(txt).lower().strip()
+            return self.get_matcher(ref, key)(txt)
 
         except InvalidToken as e:
             return False
@@ -33,4 +50,13 @@ class Enigma(Fernet):
     def decrypt_answer(self, txt):
         return self.decrypt(bytes(txt, 'UTF-8')).decode('UTF-8')
 
-enigma = Enigma(JULEKALENDER_ANSWER_KEY)
\ No newline at end of file
+    def check_token(self, txt):
+        """Raise InvalidToken unless txt was encrypted with this key. Verifies the HMAC only."""
+        self.extract_timestamp(bytes(txt, 'UTF-8'))
+        return txt
+
+enigma = Enigma(JULEKALENDER_ANSWER_KEY)
+enigma_pool = ThreadPoolExecutor(max_workers=ENIGMA_WORKERS, thread_name_prefix="enigma")
+
+async def run_enigma(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(enigma_pool, func, *args)
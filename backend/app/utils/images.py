@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.settings import IMAGE_VARIANT_WORKERS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+FORMATS = {
+    "image/jpeg": ("JPEG", "jpg"),
+    "image/png": ("PNG", "png"),
+    "image/webp": ("WEBP", "webp"),
+}
+
+variant_pool = ThreadPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants")
+
+
+def makes_variants(media_type: str) -> bool:
+    return Image is not None and media_type in FORMATS
+
+
+def make_variants(source_path: str, root: str, stem: str, media_type: str, widths: list[int]) -> list[dict]:
+    """Writes downscaled copies of an image, in its own format and as WebP.
+
+    Runs in a worker thread. Never upscales; the full-size WebP copy is always made.
+    Returns one dict per written file, ready to insert as a TaskMediaVariant.
+    """
+    if not makes_variants(media_type):
+        return []
+
+    variants = []
+    with Image.open(source_path) as image:
+        image.load()
+        sizes = [w for w in sorted(set(widths)) if w < image.width]
+
+        for width in [*sizes, image.width]:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+            targets = {media_type, "image/webp"} if width < image.width else {"image/webp"} - {media_type}
+            for target in sorted(targets):
+                pil_format, extension = FORMATS[target]
+                file_name = f"{stem}_{width}.{extension}"
+                converted = resized.convert("RGB") if pil_format == "JPEG" else resized
+                converted.save(os.path.join(root, file_name), pil_format, quality=82)
+                variants.append({
+                    "variant_file_name": file_name,
+                    "width": width,
+                    "media_type": target,
+                })
+
+    return variants
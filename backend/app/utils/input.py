@@ -1,2 +1,13 @@
 def string_washer(text: str) -> str:
-    return " ".join([w for w in text.strip() if w != " "]).lower()
\ No newline at end of file
+    return " ".join([w for w in text.strip() if w != " "]).lower()
+
+
+async def iter_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
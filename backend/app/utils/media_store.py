@@ -0,0 +1,136 @@
+import datetime
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from app.settings import MEDIA_DIR
+from app.utils.security import generate_uid
+
+class FileTooLarge(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class VariantEntry:
+    file_name: str
+    width: int
+    media_type: str
+
+
+@dataclass(frozen=True)
+class MediaEntry:
+    file_name: str
+    media_type: str
+    date: datetime.date
+    hint_number: int
+    variants: tuple[VariantEntry, ...] = ()
+
+    @classmethod
+    def from_media(cls, media, variants=()) -> "MediaEntry":
+        return cls(
+            file_name=media.file_name,
+            media_type=media.media_type,
+            date=media.date,
+            hint_number=media.hint_number,
+            variants=tuple(VariantEntry(v.variant_file_name, v.width, v.media_type) for v in variants),
+        )
+
+    def pick(self, width: Optional[int] = None, accept: str = "") -> tuple[str, str]:
+        """File name and media type to serve for a requested width and Accept header."""
+        media_type = "image/webp" if "image/webp" in accept else self.media_type
+        candidates = sorted((v for v in self.variants if v.media_type == media_type), key=lambda v: v.width)
+        if not candidates or (width is None and media_type == self.media_type):
+            return self.file_name, self.media_type
+
+        if width is not None:
+            for variant in candidates:
+                if variant.width >= width:
+                    return variant.file_name, variant.media_type
+        if media_type == self.media_type:
+            return self.file_name, self.media_type
+        return candidates[-1].file_name, candidates[-1].media_type
+
+
+def etag_for(file_name: str) -> str:
+    return f'"{file_name.rsplit(".", 1)[0]}"'
+
+
+class PartialFile:
+    """A file being written under a temporary name, hashed and size-checked as each
+    chunk arrives. commit() fsyncs it and renames it to its content hash."""
+
+    def __init__(self, store: "MediaStore", max_size: int):
+        self.store = store
+        self.max_size = max_size
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.temp_path = store.path(f".{generate_uid()}.part")
+        self._file = open(self.temp_path, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise FileTooLarge(f"upload exceeds {self.max_size} bytes")
+        self.digest.update(data)
+        self._file.write(data)
+
+    def commit(self, extension: str) -> str:
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            file_name = f"{self.digest.hexdigest()}.{extension.lower()}"
+            if os.path.exists(self.store.path(file_name)):
+                os.remove(self.temp_path)
+            else:
+                os.replace(self.temp_path, self.store.path(file_name))
+                self.store._sync_dir()
+            return file_name
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class MediaStore:
+    """Files stored under the sha256 of their content, so identical uploads share one file."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index: dict[str, MediaEntry] = {}
+
+    def path(self, file_name: str) -> str:
+        return os.path.join(self.root, file_name)
+
+    def open_partial(self, max_size: int) -> "PartialFile":
+        os.makedirs(self.root, exist_ok=True)
+        return PartialFile(self, max_size)
+
+    def _sync_dir(self):
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.root, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def remember(self, media, variants=()) -> MediaEntry:
+        entry = MediaEntry.from_media(media, variants)
+        self.index[media.file_name] = entry
+        return entry
+
+    def lookup(self, file_name: str) -> Optional[MediaEntry]:
+        return self.index.get(file_name)
+
+    def forget_date(self, date: datetime.date):
+        for file_name in [k for k, entry in self.index.items() if entry.date == date]:
+            del self.index[file_name]
+
+
+media_store = MediaStore(MEDIA_DIR)
@@ -0,0 +1,204 @@
+import datetime
+import logging
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from app.database import session_scope
+from app.models.job import JobRun
+from app.models.leaderboard import freeze_daily_results, rebuild_leaderboard
+from app.models.stats import TaskStats, freeze_task_stats
+from app.models.media import TaskMedia
+from app.models.task import Task, TaskAnswer, TaskHint, daily_task, public_tasks, calendar_cache
+from app.schemas.task import TaskStatusRead
+from app.settings import SCHEDULER_PREWARM_SECONDS, SCHEDULER_SYNC_SECONDS, SCHEDULER_MAINTENANCE_HOUR, \
+    JOB_HISTORY_DAYS
+from app.utils.broadcast import event_hub
+from app.utils.encryption import enigma
+
+TASK_JOBS = ("prewarm", "open", "close", "freeze")
+
+logger = logging.getLogger(__name__)
+
+
+async def run_once(job: str, run_key: str, action) -> bool:
+    """Run action(session) on the one worker that claims job/run_key, recording the outcome."""
+    async with session_scope() as session:
+        if not (run := await JobRun.claim(session, job, run_key)):
+            return False
+        try:
+            await action(session)
+        except Exception as e:
+            await session.rollback()
+            await run.finish(session, error=repr(e))
+            logger.exception("job %s:%s failed", job, run_key)
+            return False
+        await run.finish(session)
+        return True
+
+
+async def prewarm_task(date: datetime.date):
+    """Load the task, its answer matcher and its open response into this worker before the task opens."""
+    async with session_scope() as session:
+        if date == datetime.date.today():
+            await daily_task.load(session)
+            task = daily_task.task
+        else:
+            task = await Task.get_task(session, date)
+        public_tasks.invalidate(date)
+        await public_tasks.get(session, date, status="open")
+    if task is not None and task.answer is not None:
+        enigma.get_matcher(task.answer.text, key=task.date)
+
+
+async def open_task(date: datetime.date):
+    async with session_scope() as session:
+        cached = await public_tasks.get(session, date, status="open")
+    if cached is not None:
+        event_hub.publish("task_opened", cached[0].decode())
+
+
+async def close_task(date: datetime.date):
+    async with session_scope() as session:
+        task = await session.get(Task, date)
+    if task is not None:
+        event_hub.publish("status", TaskStatusRead(status=task.status, **task.model_dump()).model_dump_json())
+
+
+async def freeze_task(date: datetime.date) -> bool:
+    async def freeze(session):
+        await freeze_daily_results(session, date)
+        if task := await session.get(Task, date):
+            await freeze_task_stats(session, date, task.open_time)
+
+    return await run_once("freeze", date.isoformat(), freeze)
+
+
+async def rebuild_scores() -> bool:
+    return await run_once("rebuild_scores", datetime.date.today().isoformat(), rebuild_leaderboard)
+
+
+async def prune_job_runs() -> bool:
+    async def prune(session):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=JOB_HISTORY_DAYS)
+        await session.exec(delete(JobRun).where(JobRun.started < cutoff).execution_options(allow_full_scan=True))
+        await session.commit()
+
+    return await run_once("prune_job_runs", datetime.date.today().isoformat(), prune)
+
+
+class TaskScheduler:
+    """Schedules per-task jobs from each task's open and close time, plus daily maintenance.
+
+    Pre-warming and the open/close events act on caches and connections that live in
+    each worker, so every worker runs them. Freezing and maintenance change shared state
+    and go through run_once, so exactly one worker runs each of them and the JobRun
+    table keeps the history.
+    """
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler()
+        self._versions: dict[datetime.date, tuple] = {}
+
+    def schedule_task(self, date: datetime.date, open_time: datetime.datetime, close_time: datetime.datetime):
+        if not self.scheduler.running:
+            return
+
+        now = datetime.datetime.now()
+        prewarm_time = open_time - datetime.timedelta(seconds=SCHEDULER_PREWARM_SECONDS)
+        for job, func, run_time in (
+                ("prewarm", prewarm_task, prewarm_time),
+                ("open", open_task, open_time),
+                ("close", close_task, close_time),
+                ("freeze", freeze_task, close_time),
+        ):
+            if run_time > now:
+                self.scheduler.add_job(
+                    func, DateTrigger(run_time), args=[date], id=f"{job}:{date}",
+                    replace_existing=True, misfire_grace_time=SCHEDULER_SYNC_SECONDS,
+                )
+            else:
+                self._remove(f"{job}:{date}")
+
+    def unschedule_task(self, date: datetime.date):
+        for job in TASK_JOBS:
+            self._remove(f"{job}:{date}")
+
+    def _remove(self, job_id: str):
+        try:
+            self.scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass
+
+    async def sync(self):
+        """Reschedule from the task table and freeze tasks that closed while no worker was up.
+
+        Admin writes only invalidate the caches of the worker that served them, so a day
+        whose row, answer, hint count or media count differs from the last sync has its
+        caches dropped here too. Unchanged days keep theirs, prewarmed ones included.
+        """
+        hints = select(func.count()).where(TaskHint.date == Task.date).correlate(Task).scalar_subquery()
+        media = select(func.count()).where(TaskMedia.date == Task.date).correlate(Task).scalar_subquery()
+        async with session_scope() as session:
+            rows = (await session.exec(
+                select(Task.date, Task.open_time, Task.close_time, Task.info, TaskAnswer.text, TaskAnswer.yt_url,
+                       hints, media)
+                .outerjoin(TaskAnswer, TaskAnswer.date == Task.date)
+                .execution_options(allow_full_scan=True)
+            )).all()
+            # TaskStats rows are kept for good, unlike the JobRun history that prune_job_runs clears
+            frozen = set((await session.exec(
+                select(TaskStats.date).where(TaskStats.frozen).execution_options(allow_full_scan=True)
+            )).all())
+
+        versions = {row[0]: tuple(row[1:]) for row in rows}
+        changed = {date for date in versions.keys() | self._versions.keys()
+                   if versions.get(date) != self._versions.get(date)}
+        for date in changed:
+            daily_task.invalidate(date)
+            public_tasks.invalidate(date)
+            enigma.forget_matcher(date)
+        if changed:
+            calendar_cache.invalidate()
+        self._versions = versions
+
+        now = datetime.datetime.now()
+        dates = {str(date) for date in versions}
+        for job in self.scheduler.get_jobs():
+            job_type, _, date = job.id.partition(":")
+            if job_type in TASK_JOBS and date not in dates:
+                job.remove()
+
+        for date, (open_time, close_time, *_) in versions.items():
+            self.schedule_task(date, open_time, close_time)
+            if close_time <= now and date not in frozen:
+                await freeze_task(date)
+
+    def jobs(self) -> list[dict]:
+        return [{"id": job.id, "next_run_time": job.next_run_time} for job in self.scheduler.get_jobs()]
+
+    def start(self):
+        self.scheduler.add_job(
+            self.sync, IntervalTrigger(seconds=SCHEDULER_SYNC_SECONDS), id="sync",
+            next_run_time=datetime.datetime.now(), replace_existing=True,
+        )
+        self.scheduler.add_job(
+            rebuild_scores, CronTrigger(hour=SCHEDULER_MAINTENANCE_HOUR), id="rebuild_scores", replace_existing=True,
+        )
+        self.scheduler.add_job(
+            prune_job_runs, CronTrigger(hour=SCHEDULER_MAINTENANCE_HOUR, minute=30), id="prune_job_runs",
+            replace_existing=True,
+        )
+        self.scheduler.start()
+
+    def stop(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+
+task_scheduler = TaskScheduler()
@@ -1,22 +1,69 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
 
-from passlib.exc import InvalidTokenError
-
+from fastapi import HTTPException
 from fastapi.security import OAuth2PasswordBearer
 import jwt
+from jwt import InvalidTokenError
 from pydantic import BaseModel
 import uuid
 from passlib.context import CryptContext
 
-from app.settings import get_env_var
+from app.settings import get_env_var, STATELESS_TOKENS, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, \
+    MEDIA_URL_TTL
 
 SECRET_KEY = get_env_var("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 180
+MEDIA_KEY = hashlib.sha256(f"media:{SECRET_KEY}".encode()).digest()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so hashing never blocks the event loop.
+
+    At most `workers + queue` jobs are in flight; beyond that callers get a 503
+    instead of piling up behind a signup wave.
+    """
+
+    def __init__(self, workers: int, queue: int):
+        self.limit = workers + queue
+        self.jobs = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._dummy_hash: str | None = None
+
+    async def run(self, fn, *args):
+        if self.jobs >= self.limit:
+            raise HTTPException(status_code=503, detail="server busy, try again", headers={"Retry-After": "1"})
+
+        self.jobs += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.jobs -= 1
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.run(pwd_context.verify_and_update, password, hashed_password)
+
+    async def verify_dummy(self, password: str):
+        """Costs the same as a real verify, for logins with an unknown username."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(uuid.uuid4().hex)
+        await self.verify_and_update(password, self._dummy_hash)
+
+
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, queue=PASSWORD_HASH_QUEUE)
 
 
 def generate_uid() -> str:
@@ -28,12 +75,15 @@ def get_password_hash(password:str) -> str:
 def verify_password(plain_password, hashed_password) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def authenticate_user(user, password: str):
+async def authenticate_user(user, password: str):
+    """Returns the user if the password matches, and a new hash when the stored one is outdated."""
     if not user:
-        return False
-    if not verify_password(password, user.hashed_password):
-        return False
-    return user
+        await password_hasher.verify_dummy(password)
+        return False, None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return False, None
+    return user, new_hash
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -41,17 +91,42 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # iat keeps sub-second precision so a token issued right after a revocation stays valid
+    to_encode.update({"exp": expire, "iat": datetime.now(timezone.utc).timestamp()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def media_signature(file_name: str, user_id: str, expires: int) -> str:
+    message = f"{file_name}:{user_id}:{expires}".encode()
+    return hmac.new(MEDIA_KEY, message, hashlib.sha256).hexdigest()
+
+def sign_media_url(file_name: str, user_id: str) -> str:
+    expires = int(time.time()) + MEDIA_URL_TTL
+    signature = media_signature(file_name, user_id, expires)
+    return f"/media/download/{file_name}?uid={user_id}&exp={expires}&sig={signature}"
+
+def public_media_url(file_name: str) -> str:
+    """Unsigned URL, only served once the file's task has expired and is open to everyone."""
+    return f"/media/download/{file_name}"
+
+def verify_media_signature(file_name: str, user_id: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(media_signature(file_name, user_id, expires), signature)
+
 def decode_payload(payload: str):
     try:
         payload = jwt.decode(payload, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
             return None
-        token_data = TokenData(username=username)
+        token_data = TokenData(
+            username=username,
+            user_id=payload.get("uid"),
+            email=payload.get("email"),
+            full_name=payload.get("name"),
+            issued_at=payload.get("iat"),
+        )
         return token_data
     except InvalidTokenError:
         return None
@@ -62,5 +137,41 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
+    user_id: str | None = None
+    email: str | None = None
+    full_name: str | None = None
+    issued_at: float | None = None
+
+
+def get_token_claims(user) -> dict:
+    claims = {"sub": user.username}
+    if STATELESS_TOKENS:
+        claims.update({"uid": user.id, "email": user.email, "name": user.full_name})
+    return claims
+
+
+class TokenRevocations:
+    """Users whose tokens issued before a given time must be rejected.
+
+    Entries are only needed until every token issued before them has expired.
+    """
+
+    def __init__(self):
+        self._revoked: dict[str, float] = {}
+
+    def revoke(self, user_id: str):
+        now = datetime.now(timezone.utc).timestamp()
+        self._revoked[user_id] = now
+        cutoff = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        for key in [k for k, t in self._revoked.items() if t < cutoff]:
+            del self._revoked[key]
+
+    def is_revoked(self, user_id: str, issued_at: float | None) -> bool:
+        if (revoked := self._revoked.get(user_id)) is None:
+            return False
+        return issued_at is None or issued_at < revoked
+
+
+token_revocations = TokenRevocations()
 
 
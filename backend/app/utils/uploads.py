@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from typing import AsyncIterator, Collection, Optional
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.media_store import MediaStore, PartialFile
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    filename: str
+    file_name: str
+    size: int
+
+
+class _FilePart:
+    """Parser callbacks that keep the data of one named file part and drop every other part."""
+
+    def __init__(self, field: str, extensions: Collection[str]):
+        self.field = field.encode()
+        self.extensions = extensions
+        self.filename: Optional[str] = None
+        self.chunks: list[bytes] = []
+        self._headers: dict[bytes, bytes] = {}
+        self._name = self._value = b""
+        self._wanted = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers.clear()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._name.lower()] = self._value
+        self._name = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._wanted = options.get(b"name") == self.field and b"filename" in options and self.filename is None
+        if self._wanted:
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+            extension = self.filename.split(".")[-1]
+            if extension.upper() not in self.extensions:
+                raise UnsupportedFileType(f"Unsupported file type {extension}")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._wanted:
+            self.chunks.append(data[start:end])
+
+    def on_part_end(self):
+        self._wanted = False
+
+
+async def receive_file(store: MediaStore, content_type: str, body: AsyncIterator[bytes], field: str,
+                       max_size: int, extensions: Collection[str]) -> StoredUpload:
+    """Write the file part `field` of a multipart body into the store while it arrives.
+
+    The body is parsed chunk by chunk and the file's bytes go straight to the store,
+    so they are hashed and size-checked in the same pass as the network read and
+    written to disk once, with no spooled copy of the whole form first.
+    """
+    _, options = parse_options_header(content_type)
+    if b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data body")
+
+    part = _FilePart(field, extensions)
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    partial: Optional[PartialFile] = None
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            if part.filename is not None and partial is None:
+                partial = await run_in_threadpool(store.open_partial, max_size)
+            if part.chunks:
+                data = b"".join(part.chunks)
+                part.chunks.clear()
+                await run_in_threadpool(partial.write, data)
+        parser.finalize()
+        if partial is None:
+            raise UploadError(f"Missing file field '{field}'")
+        file_name = await run_in_threadpool(partial.commit, part.filename.split(".")[-1])
+        upload = StoredUpload(filename=part.filename, file_name=file_name, size=partial.size)
+        partial = None
+        return upload
+
+    except FormParserError as e:
+        raise UploadError(f"Malformed multipart body: {e}") from e
+    finally:
+        if partial is not None:
+            # synchronous on purpose: this also runs when the client hangs up mid-upload
+            partial.discard()
@@ -0,0 +1,187 @@
+"""
+Shared setup for the backend tests: a throwaway SQLite database with the full-scan
+check switched on, the scheduler off and cheap bcrypt. Settings are read when app is
+imported, so the environment is set first.
+
+Run from backend/ with `python -m pytest -q`. Benchmarks are marked `benchmark`
+(deselect with `-m "not benchmark"`) and scale with BENCH_SCALE.
+"""
+import datetime
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pytest
+from cryptography.fernet import Fernet
+
+TEST_DIR = tempfile.mkdtemp(prefix="julekalender-tests-")
+DB_PATH = os.path.join(TEST_DIR, "test.db")
+os.environ.update({
+    "JULEKALENDER_DB_URL": f"sqlite+aiosqlite:///{DB_PATH}",
+    "JULEKALENDER_MEDIA_DIR": os.path.join(TEST_DIR, "files"),
+    "JULEKALENDER_ANSWER_KEY": Fernet.generate_key().decode(),
+    "JULEKALENDER_SECRET_KEY": "tests-only-secret-key-of-at-least-32-bytes",
+    "JULEKALENDER_QUERY_PLAN_CHECK": "1",
+    "JULEKALENDER_SCHEDULER_ENABLED": "0",
+    "JULEKALENDER_BCRYPT_ROUNDS": "4",
+})
+
+import httpx
+from sqlalchemy import event, insert, update
+from sqlmodel import SQLModel
+
+from app.api import app
+from app.database import engine, session_scope
+from app.migrations import schema_version
+from app.models.task import Task, daily_task, public_tasks, calendar_cache
+from app.models.user import User, TaskTracker, user_cache, attempt_log
+from app.utils.admission import attempt_gate
+from app.utils.media_store import media_store
+
+BENCH_SCALE = float(os.environ.get("BENCH_SCALE", 1))
+BENCH_RESULTS: list[str] = []
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: measures throughput or latency, scaled by BENCH_SCALE")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if BENCH_RESULTS:
+        terminalreporter.section("benchmarks")
+        for line in BENCH_RESULTS:
+            terminalreporter.write_line(line)
+
+
+def scaled(n: int) -> int:
+    return max(1, int(n * BENCH_SCALE))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def bench(request):
+    """Records one line of measurements for the summary at the end of the run."""
+    def report(**values):
+        formatted = ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in values.items())
+        BENCH_RESULTS.append(f"{request.node.name}: {formatted}")
+    return report
+
+
+async def reset_state():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(schema_version.drop, checkfirst=True)
+    daily_task.invalidate()
+    public_tasks.invalidate()
+    calendar_cache.invalidate()
+    user_cache.clear()
+    attempt_gate.forget()
+    attempt_log.clear()
+    media_store.index.clear()
+
+
+@pytest.fixture
+async def client():
+    await reset_state()
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+async def create_task(client: httpx.AsyncClient, date: datetime.date = None, answer: str = "Snow Man",
+                      hints: int = 2, status: str = "open") -> datetime.date:
+    """Create a task through the admin API and move its times so it has the given status now."""
+    date = date or datetime.date.today()
+    response = await client.post(f"/admin/task/{date}/", json={
+        "info": f"task {date}", "author": None, "answer": answer, "open_time": 9, "close_time": 23, "yt_url": None,
+    })
+    assert response.status_code == 200, response.text
+    for number in range(hints):
+        response = await client.post(f"/admin/task/{date}/hint/", json={"info": f"hint {number + 1}"})
+        assert response.status_code == 200, response.text
+
+    now = datetime.datetime.now()
+    open_time, close_time = {
+        "open": (now - datetime.timedelta(hours=1), now + datetime.timedelta(hours=1)),
+        "closed": (now + datetime.timedelta(hours=1), now + datetime.timedelta(hours=2)),
+        "expired": (now - datetime.timedelta(hours=2), now - datetime.timedelta(hours=1)),
+    }[status]
+    async with session_scope() as session:
+        await session.exec(update(Task).where(Task.date == date).values(open_time=open_time, close_time=close_time))
+        await session.commit()
+    daily_task.invalidate()
+    public_tasks.invalidate()
+    calendar_cache.invalidate()
+    return date
+
+
+async def signup(client: httpx.AsyncClient, username: str, password: str = "password") -> dict:
+    """Create a user and return the Authorization header of a fresh token."""
+    response = await client.post("/user/", json={
+        "email": f"{username}@example.com", "full_name": username.title(), "username": username, "password": password,
+    })
+    assert response.status_code == 200, response.text
+    response = await client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def bulk_users(count: int, prefix: str = "bulk") -> list[str]:
+    """Insert users straight into the database, skipping signup and bcrypt, and return their ids."""
+    rows = [{"id": f"{prefix}{i:06d}", "username": f"{prefix}{i}", "full_name": f"{prefix} {i}",
+             "email": f"{prefix}{i}@example.com", "email_verified": False, "hashed_password": "-"}
+            for i in range(count)]
+    async with session_scope() as session:
+        await session.exec(insert(User), params=rows)
+        await session.commit()
+    return [row["id"] for row in rows]
+
+
+async def bulk_trackers(user_ids: list[str], date: datetime.date, solved_every: int = 1):
+    """Give each user a tracker for the date; every solved_every-th user has solved it, with varied scores."""
+    open_time = datetime.datetime.combine(date, datetime.time(9))
+    rows = []
+    for i, user_id in enumerate(user_ids):
+        solved = i % solved_every == 0
+        hints_used = i % 3
+        rows.append({
+            "date": date, "user_id": user_id, "solved": solved, "hints_used": hints_used,
+            "time_solved": open_time + datetime.timedelta(seconds=i % 7200) if solved else None,
+            "score": (10, 7, 5)[hints_used] if solved else 0,
+            "attempts_left": 0, "attempts_total": 1 + i % 5,
+        })
+    async with session_scope() as session:
+        await session.exec(insert(TaskTracker), params=rows)
+        await session.commit()
+
+
+@contextmanager
+def captured_queries():
+    """Collects (statement, parameters) of every statement the app engine sends to SQLite."""
+    queries: list[tuple[str, tuple]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if context is None or not context.execution_options.get("allow_full_scan"):
+            queries.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield queries
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+@contextmanager
+def timer():
+    """Yields a dict whose "seconds" is filled in when the block exits."""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+from collections import Counter
+
+import pytest
+
+from app.settings import ATTEMPTS_PER_RESET
+from conftest import create_task, scaled, signup, timer
+
+pytestmark = pytest.mark.anyio
+
+ANSWER = "^s n o w m a n$"
+
+
+async def test_attempt_limit_holds_under_concurrent_answers(client):
+    today = await create_task(client, answer=ANSWER)
+    headers = await signup(client, "alice")
+
+    responses = await asyncio.gather(*[
+        client.post("/task/answer", params={"answer": f"guess {i % 15}"}, headers=headers) for i in range(30)
+    ])
+    statuses = Counter(r.status_code for r in responses)
+
+    tracker = (await client.get("/user/results/today", headers=headers)).json()
+    stats = (await client.get(f"/admin/task/{today}/stats/")).json()
+    assert statuses[200] == ATTEMPTS_PER_RESET
+    assert tracker["attempts_total"] == ATTEMPTS_PER_RESET
+    assert tracker["attempts_left"] == 0
+    assert stats["attempts"] == ATTEMPTS_PER_RESET
+    assert stats["participants"] == 1
+
+
+async def test_hint_unlock_racing_a_solve_keeps_score_consistent(client):
+    await create_task(client, answer=ANSWER, hints=3)
+    users = [await signup(client, f"user{i}") for i in range(10)]
+
+    await asyncio.gather(*[
+        request for headers in users for request in (
+            client.post("/task/hint/unlock", headers=headers),
+            client.post("/task/answer", params={"answer": "snowman"}, headers=headers),
+            client.post("/task/hint/unlock", headers=headers),
+        )
+    ])
+
+    for headers in users:
+        tracker = (await client.get("/user/results/today", headers=headers)).json()
+        assert tracker["solved"]
+        assert tracker["score"] == {0: 10, 1: 7, 2: 5}[tracker["hints_used"]]
+
+
+@pytest.mark.benchmark
+async def test_concurrent_answer_throughput(client, bench):
+    """Answers per second sent one at a time and all at once, and how long /time waits meanwhile."""
+    await create_task(client, answer=ANSWER)
+    users = [await signup(client, f"user{i}") for i in range(scaled(40))]
+    rounds = 4
+
+    with timer() as sequential:
+        for n in range(rounds):
+            for headers in users:
+                response = await client.post("/task/answer", params={"answer": f"first {n}"}, headers=headers)
+                assert response.status_code == 200
+
+    done = asyncio.Event()
+    probe_ms = []
+
+    async def probe():
+        while not done.is_set():
+            with timer() as probe_time:
+                await client.get("/time")
+            probe_ms.append(probe_time["seconds"] * 1000)
+            await asyncio.sleep(0.001)
+
+    async def load():
+        try:
+            return await asyncio.gather(*[
+                client.post("/task/answer", params={"answer": f"second {n}"}, headers=headers)
+                for n in range(rounds) for headers in users
+            ])
+        finally:
+            done.set()
+
+    with timer() as concurrent:
+        responses, _ = await asyncio.gather(load(), probe())
+    assert all(r.status_code == 200 for r in responses)
+
+    answers = rounds * len(users)
+    bench(
+        answers=answers,
+        sequential_per_s=answers / sequential["seconds"],
+        concurrent_per_s=answers / concurrent["seconds"],
+        time_probe_median_ms=statistics.median(probe_ms),
+        time_probe_max_ms=max(probe_ms),
+    )
@@ -0,0 +1,30 @@
+import datetime
+
+import pytest
+
+from app.database import session_scope
+from app.models.user import TaskAttempt, attempt_log
+from conftest import signup
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_pending_attempts_are_found_by_key_until_written(client):
+    headers = await signup(client, "alice")
+    user_id = (await client.get("/user/", headers=headers)).json()["id"]
+    today = datetime.date.today()
+    now = datetime.datetime.now()
+
+    attempt_log.add(date=today, user_id=user_id, text="a", correct=False, created=now)
+    attempt_log.add(date=today, user_id=user_id, text="a", correct=False, created=now)
+    attempt_log.add(date=today, user_id=user_id, text="b", correct=False, created=now)
+    assert attempt_log.contains(today, user_id, "a")
+    assert not attempt_log.contains(today, user_id, "c")
+
+    await attempt_log.flush()
+    assert not attempt_log.contains(today, user_id, "a")
+    assert not attempt_log.contains(today, user_id, "b")
+    async with session_scope() as session:
+        assert await TaskAttempt.is_duplicate(session, today, user_id, "a")
+        assert await TaskAttempt.is_duplicate(session, today, user_id, "b")
+        assert not await TaskAttempt.is_duplicate(session, today, user_id, "c")
@@ -0,0 +1,36 @@
+import datetime
+
+import pytest
+
+from conftest import bulk_trackers, captured_queries, create_task, signup
+
+pytestmark = pytest.mark.anyio
+
+
+async def dashboard_queries(client, headers: dict) -> tuple[dict, int]:
+    with captured_queries() as queries:
+        response = await client.get("/user/dashboard", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json(), len(queries)
+
+
+async def test_dashboard_query_count_does_not_grow_with_days(client):
+    today = await create_task(client, hints=3)
+    headers = await signup(client, "alice")
+    await client.post("/task/hint/unlock", headers=headers)
+    await client.post("/task/answer", params={"answer": "wrong"}, headers=headers)
+    user_id = (await client.get("/user/", headers=headers)).json()["id"]
+
+    # the first call fills the user cache; later ones show the steady state
+    await dashboard_queries(client, headers)
+    one_day, one_day_queries = await dashboard_queries(client, headers)
+
+    for days_back in range(1, 31):
+        await bulk_trackers([user_id], today - datetime.timedelta(days=days_back))
+    many_days, many_days_queries = await dashboard_queries(client, headers)
+
+    assert len(one_day["results"]) == 1
+    assert len(many_days["results"]) == 31
+    assert len(many_days["hints"]) == 1
+    assert many_days["today"]["attempts_total"] == 1
+    assert one_day_queries == many_days_queries <= 2
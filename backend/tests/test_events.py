@@ -0,0 +1,114 @@
+import asyncio
+import gc
+import tracemalloc
+
+import pytest
+
+from app.api import app
+from app.utils.broadcast import BroadcastHub, event_hub
+from conftest import create_task, scaled, timer
+
+pytestmark = pytest.mark.anyio
+
+
+async def open_stream(path: str = "/events", headers: list[tuple[bytes, bytes]] = ()):
+    """Start a request straight on the ASGI app. httpx's ASGITransport would wait for
+    the end of the body, which an event stream never reaches."""
+    chunks: asyncio.Queue[bytes] = asyncio.Queue()
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            await chunks.put(message)
+        elif message.get("body"):
+            await chunks.put(message["body"])
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+             "headers": [(b"host", b"test"), *headers], "client": ("test", 1), "server": ("test", 80)}
+    request = asyncio.create_task(app(scope, receive, send))
+    return chunks, disconnect, request
+
+
+async def test_event_stream_delivers_and_resumes(client):
+    await create_task(client)
+    chunks, disconnect, request = await open_stream()
+
+    start = await asyncio.wait_for(chunks.get(), 5)
+    assert start["status"] == 200
+    initial = await asyncio.wait_for(chunks.get(), 5)
+    assert initial.startswith(b"retry: ") and b"event: time" in initial and b"event: status" in initial
+
+    event_hub.publish("hint", '{"hint_number": 1}')
+    event_hub.publish("hint", '{"hint_number": 2}')
+    received = b""
+    while b'"hint_number": 2' not in received:
+        received += await asyncio.wait_for(chunks.get(), 5)
+    assert received.index(b'"hint_number": 1') < received.index(b'"hint_number": 2')
+    disconnect.set()
+    await asyncio.wait_for(request, 5)
+    assert event_hub.subscribers == 0
+
+    missed_from = event_hub.last_id - 1
+    chunks, disconnect, request = await open_stream(headers=[(b"last-event-id", str(missed_from).encode())])
+    await chunks.get()
+    await chunks.get()
+    assert b'"hint_number": 2' in await asyncio.wait_for(chunks.get(), 5)
+    disconnect.set()
+    await asyncio.wait_for(request, 5)
+
+
+@pytest.mark.benchmark
+async def test_event_fan_out(bench):
+    """scaled(2000) idle subscribers on one hub: memory each, and how long one event takes to reach all of them."""
+    hub = BroadcastHub(keepalive=60)
+    subscribers = scaled(2000)
+    events = 20
+    primed = asyncio.Semaphore(0)
+    received = [0] * subscribers
+
+    async def listen(n: int):
+        stream = hub.subscribe(initial=b"")
+        await anext(stream)
+        primed.release()
+        try:
+            async for chunk in stream:
+                received[n] += chunk.count(b"event: tick")
+                if received[n] >= events:
+                    return
+        finally:
+            await stream.aclose()
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    listeners = [asyncio.create_task(listen(n)) for n in range(subscribers)]
+    for _ in range(subscribers):
+        await primed.acquire()
+    idle, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert hub.subscribers == subscribers
+
+    with timer() as first:
+        hub.publish("tick", "0")
+        while min(received) < 1:
+            await asyncio.sleep(0)
+
+    with timer() as burst:
+        for n in range(1, events):
+            hub.publish("tick", str(n))
+            await asyncio.sleep(0)
+        await asyncio.gather(*listeners)
+    assert received == [events] * subscribers
+    assert hub.subscribers == 0
+
+    bench(
+        subscribers=subscribers,
+        bytes_per_subscriber=(idle - before) // subscribers,
+        fan_out_ms=first["seconds"] * 1000,
+        deliveries_per_s=subscribers * (events - 1) / burst["seconds"],
+    )
@@ -0,0 +1,59 @@
+import datetime
+import statistics
+
+import pytest
+
+from app.database import session_scope
+from app.models.leaderboard import freeze_daily_results
+from conftest import bulk_trackers, bulk_users, create_task, scaled, signup, timer
+
+pytestmark = pytest.mark.anyio
+
+DAYS = 3
+
+
+async def median_ms(client, url: str, headers: dict = None, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            response = await client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        samples.append(elapsed["seconds"] * 1000)
+    return statistics.median(samples)
+
+
+@pytest.mark.benchmark
+async def test_leaderboard_reads_and_rebuild(client, bench):
+    """Leaderboard reads over scaled(5000) users with DAYS solved tasks each (50k at BENCH_SCALE=10)."""
+    today = datetime.date.today()
+    dates = [await create_task(client, date=today - datetime.timedelta(days=d), status="expired")
+             for d in range(1, DAYS + 1)]
+    headers = await signup(client, "me")
+    me = (await client.get("/user/", headers=headers)).json()["id"]
+    user_ids = await bulk_users(scaled(5000)) + [me]
+    for date in dates:
+        await bulk_trackers(user_ids, date)
+
+    with timer() as rebuild:
+        response = await client.post("/admin/user/scores/rebuild/")
+    assert response.json() == {"users": len(user_ids)}
+
+    top = (await client.get("/leaderboard/", params={"limit": 10})).json()
+    assert [entry["rank"] for entry in top] == list(range(1, 11))
+    assert top[0]["score"] >= top[-1]["score"]
+
+    live_daily_ms = await median_ms(client, f"/leaderboard/{dates[0]}?limit=100")
+    async with session_scope() as session:
+        with timer() as freeze:
+            await freeze_daily_results(session, dates[0])
+
+    bench(
+        users=len(user_ids),
+        rebuild_ms=rebuild["seconds"] * 1000,
+        top100_ms=await median_ms(client, "/leaderboard/?limit=100"),
+        deep_page_ms=await median_ms(client, f"/leaderboard/?offset={len(user_ids) // 2}&limit=100"),
+        my_rank_ms=await median_ms(client, "/leaderboard/me", headers=headers),
+        daily_live_ms=live_daily_ms,
+        freeze_day_ms=freeze["seconds"] * 1000,
+        daily_frozen_ms=await median_ms(client, f"/leaderboard/{dates[0]}?limit=100"),
+    )
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+from sqlalchemy import delete, insert
+from sqlmodel import select
+
+import app.routes.media
+from app.database import session_scope
+from app.models.media import TaskMediaVariant
+from app.utils.media_store import media_store
+from conftest import create_task, signup
+
+pytestmark = pytest.mark.anyio
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def test_worker_without_variants_picks_them_up_once_made(client):
+    today = await create_task(client)
+    headers = await signup(client, "alice")
+    upload = await client.post("/media/upload/", params={"date": str(today)},
+                               files={"file": ("map.png", io.BytesIO(png(800, 600)), "image/png")})
+    file_name = upload.json()["file_name"]
+    url = (await client.get("/task/media", headers=headers)).json()[0]["url"]
+
+    # another worker: nothing in its index, and the uploading worker has not written the variants yet
+    async with session_scope() as session:
+        variants = [v.model_dump() for v in (await session.exec(
+            select(TaskMediaVariant).where(TaskMediaVariant.file_name == file_name)
+        )).all()]
+        await session.exec(delete(TaskMediaVariant).where(TaskMediaVariant.file_name == file_name))
+        await session.commit()
+    media_store.index.clear()
+
+    original = await client.get(url + "&size=160")
+    assert original.status_code == 200
+    assert original.headers["content-type"] == "image/png"
+    assert media_store.lookup(file_name) is None
+
+    async with session_scope() as session:
+        await session.exec(insert(TaskMediaVariant), params=variants)
+        await session.commit()
+
+    small = await client.get(url + "&size=160")
+    assert small.headers["Vary"] == "Accept"
+    assert small.headers["ETag"] != original.headers["ETag"]
+    assert len(small.content) < len(original.content)
+    assert media_store.lookup(file_name).variants
+
+
+def stored_files() -> list[str]:
+    return sorted(os.listdir(media_store.root)) if os.path.isdir(media_store.root) else []
+
+
+async def test_upload_is_stored_under_its_hash_in_one_pass(client):
+    today = await create_task(client)
+    content = png(64, 64)
+    response = await client.post("/media/upload/", params={"date": str(today), "hint_number": 1},
+                                 data={"description": "ignored"},
+                                 files={"file": ("map.PNG", io.BytesIO(content), "image/png")})
+
+    assert response.status_code == 200, response.text
+    file_name = response.json()["file_name"]
+    assert file_name == f"{hashlib.sha256(content).hexdigest()}.png"
+    with open(media_store.path(file_name), "rb") as f:
+        assert f.read() == content
+    assert not [name for name in stored_files() if name.endswith(".part")]
+
+
+@pytest.mark.parametrize("files, status", [
+    ({"file": ("run.exe", io.BytesIO(b"MZ"), "application/octet-stream")}, 415),
+    ({"other": ("map.png", io.BytesIO(b"x"), "image/png")}, 400),
+    ({"file": ("map.png", io.BytesIO(b"x" * 5000), "image/png")}, 413),
+])
+async def test_rejected_uploads_leave_nothing_behind(client, monkeypatch, files, status):
+    monkeypatch.setattr(app.routes.media, "MEDIA_MAX_UPLOAD_BYTES", 1000)
+    today = await create_task(client)
+    before = stored_files()
+
+    response = await client.post("/media/upload/", params={"date": str(today)}, files=files)
+
+    assert response.status_code == status, response.text
+    assert stored_files() == before
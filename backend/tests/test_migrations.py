@@ -0,0 +1,49 @@
+import datetime
+import json
+
+import pytest
+from sqlalchemy import delete, text
+from sqlmodel import select
+
+from app.database import engine, session_scope
+from app.migrations import run_migrations, schema_version
+from app.models.user import TaskAttempt, TaskTracker
+from conftest import bulk_users
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_old_tracker_attempts_are_copied_to_taskattempt(client):
+    alice, bob = await bulk_users(2)
+    today = datetime.date.today()
+    solved_at = datetime.datetime.combine(today, datetime.time(10, 30))
+
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE tasktracker ADD COLUMN attempts JSON"))
+        await conn.execute(
+            text("INSERT INTO tasktracker (date, user_id, solved, time_solved, score, hints_used, attempts_left, "
+                 "attempts_total, attempts) VALUES (:date, :user_id, :solved, :time_solved, 0, 0, 0, 0, :attempts)"),
+            [{"date": today, "user_id": alice, "solved": True, "time_solved": solved_at,
+              "attempts": json.dumps(["s k i", "s n o w"])},
+             {"date": today, "user_id": bob, "solved": False, "time_solved": None, "attempts": json.dumps(["s k i"])}],
+        )
+        await conn.execute(delete(schema_version).where(schema_version.c.version >= 4))
+
+    await run_migrations()
+
+    async with session_scope() as session:
+        attempts = (await session.exec(
+            select(TaskAttempt.user_id, TaskAttempt.text, TaskAttempt.correct, TaskAttempt.created)
+            .where(TaskAttempt.date == today)
+            .execution_options(allow_full_scan=True)
+        )).all()
+        alice_tracker = await TaskTracker.get_daily_task_tracker(alice, session, today)
+        assert await TaskAttempt.is_duplicate(session, today, bob, "s k i")
+
+    day_start = datetime.datetime.combine(today, datetime.time.min)
+    assert sorted(attempts) == sorted([
+        (alice, "s k i", False, day_start),
+        (alice, "s n o w", True, solved_at),
+        (bob, "s k i", False, day_start),
+    ])
+    assert alice_tracker.attempts_total == 2
@@ -0,0 +1,123 @@
+import datetime
+import io
+import sqlite3
+
+import pytest
+
+from app.database import is_full_scan, session_scope
+from app.models.leaderboard import UserScore, freeze_daily_results
+from app.models.stats import freeze_task_stats
+from app.models.user import User, TaskTracker, TaskAttempt, get_user_task_trackers
+from conftest import DB_PATH, captured_queries, create_task, signup
+
+pytestmark = pytest.mark.anyio
+
+# string_washer spaces out every character, so the answer is written against the washed text
+ANSWER = "^s n o w m a n$"
+
+
+def full_scans(queries: list[tuple[str, tuple]]) -> list[str]:
+    """Each query whose EXPLAIN QUERY PLAN has a SCAN step over a table, with that step."""
+    scans = []
+    with sqlite3.connect(DB_PATH) as conn:
+        for statement, parameters in queries:
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            for row in conn.execute("EXPLAIN QUERY PLAN " + statement, parameters):
+                if is_full_scan(row[-1], statement):
+                    scans.append(f"{row[-1]} in: {statement}")
+    return scans
+
+
+def test_index_walks_count_as_full_scans_without_limit():
+    assert is_full_scan("SCAN user", "SELECT * FROM user LIMIT 1")
+    assert is_full_scan("SCAN tasktracker USING INDEX ix_tasktracker_user_id", "SELECT * FROM tasktracker")
+    assert is_full_scan("SCAN userscore USING COVERING INDEX ix_userscore_rank", "SELECT count(*) FROM userscore")
+    assert not is_full_scan("SCAN userscore USING INDEX ix_userscore_rank", "SELECT * FROM userscore LIMIT ?")
+    assert not is_full_scan("SEARCH user USING INDEX ix_user_id (id>?)", "SELECT * FROM user")
+    assert not is_full_scan("SCAN sqlite_master", "SELECT * FROM sqlite_master")
+
+
+async def test_route_queries_use_indexes(client):
+    today = await create_task(client, answer=ANSWER)
+    past = await create_task(client, date=today - datetime.timedelta(days=1), status="expired")
+    alice = await signup(client, "alice")
+    bob = await signup(client, "bob")
+    upload = await client.post("/media/upload/", params={"date": str(today), "hint_number": 1},
+                               files={"file": ("hint.mp3", io.BytesIO(b"x" * 100), "audio/mp3")})
+    assert upload.status_code == 200, upload.text
+    user_id = (await client.get("/user/", headers=alice)).json()["id"]
+
+    with captured_queries() as queries:
+        responses = [
+            await client.post("/task/answer", params={"answer": "wrong"}, headers=alice),
+            await client.post("/task/answer", params={"answer": "wrong"}, headers=alice),
+            await client.post("/task/hint/unlock", headers=alice),
+            await client.get("/task/hint", headers=alice),
+            await client.get("/task/media", headers=alice),
+            await client.post("/task/answer", params={"answer": "Snow Man"}, headers=alice),
+            await client.post("/task/answer", params={"answer": "snowman"}, headers=bob),
+            await client.get(f"/task/{today}"),
+            await client.get(f"/task/{past}"),
+            await client.get("/user/", headers=alice),
+            await client.get("/user/results/", headers=alice),
+            await client.get("/user/results/today", headers=alice),
+            await client.get("/user/dashboard", headers=alice),
+            await client.get("/calendar"),
+            await client.get("/calendar", headers=alice),
+            await client.get("/leaderboard/"),
+            await client.get("/leaderboard/me", headers=alice),
+            await client.get(f"/leaderboard/{today}"),
+            await client.get(f"/admin/task/{today}/"),
+            await client.get(f"/admin/task/{today}/stats/"),
+            await client.get(f"/admin/user/{user_id}/"),
+            await client.get(f"/admin/user/{user_id}/task/"),
+            await client.get("/admin/user/", params={"limit": 1}),
+            await client.get("/admin/user/", params={"after": user_id, "limit": 10}),
+            await client.get("/leaderboard/", params={"offset": 1, "limit": 10}),
+            await client.get(f"/leaderboard/{today}", params={"offset": 1, "limit": 10}),
+        ]
+        media = (await client.get("/task/media", headers=alice)).json()
+        responses.append(await client.get(media[0]["url"]))
+
+    duplicate = responses.pop(1)
+    assert duplicate.json()["detail"]["type"] == "duplicate"
+    assert [r.status_code for r in responses if r.status_code >= 400] == []
+    assert responses[4].json()["message"] == "correct"
+    assert full_scans(queries) == []
+
+
+async def test_hot_model_queries_use_indexes(client):
+    today = await create_task(client, answer=ANSWER)
+    headers = await signup(client, "carol")
+    await client.post("/task/answer", params={"answer": "snowman"}, headers=headers)
+    user_id = (await client.get("/user/", headers=headers)).json()["id"]
+
+    async with session_scope() as session:
+        with captured_queries() as queries:
+            assert await User.get_user_by_username_or_email(session, "carol@example.com")
+            assert await get_user_task_trackers(session, user_id)
+            assert not (await TaskTracker.get_daily_task_tracker(user_id, session, today)).is_new
+            assert not await TaskAttempt.is_duplicate(session, today, user_id, "never tried")
+            assert await UserScore.get_rank(session, user_id) == 1
+            await freeze_daily_results(session, today)
+            await freeze_task_stats(session, today, datetime.datetime.now())
+
+    assert len(queries) >= 8
+    assert full_scans(queries) == []
+
+
+async def test_leaderboard_pages_need_no_sort(client):
+    await create_task(client, answer=ANSWER)
+    for name in ("alice", "bob", "carol"):
+        headers = await signup(client, name)
+        await client.post("/task/answer", params={"answer": "snowman"}, headers=headers)
+
+    with captured_queries() as queries:
+        assert len((await client.get("/leaderboard/", params={"offset": 1, "limit": 2})).json()) == 2
+
+    with sqlite3.connect(DB_PATH) as conn:
+        plans = [row[-1] for statement, parameters in queries if "userscore" in statement
+                 for row in conn.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+    assert any("ix_userscore_rank" in step for step in plans)
+    assert not any("TEMP B-TREE" in step for step in plans)
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+from sqlalchemy import update
+from sqlmodel import select
+
+from app.database import session_scope
+from app.models.job import JobRun
+from app.models.task import Task, daily_task
+from app.utils.scheduler import prewarm_task, prune_job_runs, task_scheduler
+from conftest import create_task
+
+pytestmark = pytest.mark.anyio
+
+
+async def freeze_runs() -> list[str]:
+    async with session_scope() as session:
+        return list((await session.exec(
+            select(JobRun.run_key).where(JobRun.job == "freeze").execution_options(allow_full_scan=True)
+        )).all())
+
+
+async def test_sync_freezes_a_closed_task_once_even_after_pruning(client):
+    past = await create_task(client, date=datetime.date.today() - datetime.timedelta(days=1), status="expired")
+
+    await task_scheduler.sync()
+    await task_scheduler.sync()
+    assert await freeze_runs() == [past.isoformat()]
+    assert (await client.get(f"/admin/task/{past}/stats/")).json()["frozen"]
+
+    async with session_scope() as session:
+        await session.exec(
+            update(JobRun).values(started=datetime.datetime(2000, 1, 1)).execution_options(allow_full_scan=True)
+        )
+        await session.commit()
+    assert await prune_job_runs()
+    await task_scheduler.sync()
+    assert await freeze_runs() == []
+
+
+async def test_sync_keeps_unchanged_caches_and_drops_edited_ones(client):
+    today = await create_task(client)
+    await task_scheduler.sync()
+    await prewarm_task(today)
+    prewarmed = daily_task.task
+    body = (await client.get(f"/task/{today}")).content
+
+    await task_scheduler.sync()
+    assert daily_task.task is prewarmed and not daily_task.is_stale()
+    assert (await client.get(f"/task/{today}")).content == body
+
+    # an edit served by another worker, which only invalidated its own caches
+    async with session_scope() as session:
+        await session.exec(update(Task).where(Task.date == today).values(info="edited"))
+        await session.commit()
+    await task_scheduler.sync()
+    assert daily_task.is_stale()
+    assert (await client.get(f"/task/{today}")).json()["info"] == "edited"
@@ -0,0 +1,79 @@
+import asyncio
+import statistics
+from collections import Counter
+
+import pytest
+
+import app.utils.security
+from app.utils.security import password_hasher, pwd_context
+from conftest import create_task, scaled, signup, timer
+
+pytestmark = pytest.mark.anyio
+
+ANSWER = "^s n o w m a n$"
+
+
+@pytest.fixture
+def production_bcrypt(monkeypatch):
+    """bcrypt at a realistic cost, so each hash holds a worker thread for tens of milliseconds."""
+    monkeypatch.setattr(app.utils.security, "pwd_context", pwd_context.copy(bcrypt__rounds=10))
+
+
+def new_user(username: str) -> dict:
+    return {"email": f"{username}@example.com", "full_name": username, "username": username, "password": "password"}
+
+
+async def answer_latencies_ms(client, users: list[dict], label: str, per_user: int = 3) -> list[float]:
+    samples = []
+    for n in range(per_user):
+        for headers in users:
+            with timer() as elapsed:
+                response = await client.post("/task/answer", params={"answer": f"{label} {n}"}, headers=headers)
+            assert response.status_code == 200, response.text
+            samples.append(elapsed["seconds"] * 1000)
+    return samples
+
+
+def percentile(samples: list[float], q: int) -> float:
+    return statistics.quantiles(samples, n=100)[q - 1]
+
+
+async def test_signup_wave_gets_503_instead_of_queueing(client, production_bcrypt, monkeypatch):
+    await create_task(client, answer=ANSWER)
+    headers = await signup(client, "player")
+    monkeypatch.setattr(password_hasher, "limit", 2)
+
+    signups = asyncio.gather(*[client.post("/user/", json=new_user(f"wave{i}")) for i in range(10)])
+    answer = await client.post("/task/answer", params={"answer": "snowman"}, headers=headers)
+    responses = await signups
+
+    assert answer.json()["message"] == "correct"
+    assert Counter(r.status_code for r in responses) == {200: 2, 503: 8}
+    assert all(r.headers["Retry-After"] == "1" for r in responses if r.status_code == 503)
+    assert password_hasher.jobs == 0
+
+
+@pytest.mark.benchmark
+async def test_answer_latency_during_signups(client, production_bcrypt, bench):
+    """Answer latency alone and while scaled(40) signups hash their passwords."""
+    await create_task(client, answer=ANSWER)
+    users = [await signup(client, f"user{i}") for i in range(scaled(10))]
+
+    quiet = await answer_latencies_ms(client, users, "quiet")
+
+    signups = asyncio.gather(*[client.post("/user/", json=new_user(f"wave{i}")) for i in range(scaled(40))])
+    with timer() as wave:
+        busy = await answer_latencies_ms(client, users, "busy")
+        responses = await signups
+    statuses = Counter(r.status_code for r in responses)
+    assert set(statuses) <= {200, 503}
+
+    bench(
+        quiet_p50_ms=statistics.median(quiet),
+        quiet_p95_ms=percentile(quiet, 95),
+        busy_p50_ms=statistics.median(busy),
+        busy_p95_ms=percentile(busy, 95),
+        signups_ok=statuses[200],
+        signups_503=statuses[503],
+        wave_s=wave["seconds"],
+    )
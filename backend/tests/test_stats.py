@@ -0,0 +1,61 @@
+import datetime
+import statistics
+
+import pytest
+from sqlalchemy import insert
+
+from app.database import session_scope
+from app.models.stats import TaskStats, count_task_stats, freeze_task_stats
+from app.models.task import Task
+from app.models.user import TaskAttempt
+from conftest import bulk_trackers, bulk_users, create_task, scaled, timer
+
+pytestmark = pytest.mark.anyio
+
+
+async def stats_ms(client, date: datetime.date, repeat: int = 10) -> tuple[dict, float]:
+    samples = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            response = await client.get(f"/admin/task/{date}/stats/")
+        assert response.status_code == 200, response.text
+        samples.append(elapsed["seconds"] * 1000)
+    return response.json(), statistics.median(samples)
+
+
+@pytest.mark.benchmark
+async def test_task_stats_timing(client, bench):
+    """Admin stats for a day with scaled(10000) trackers (100k at BENCH_SCALE=10), live and once frozen."""
+    date = await create_task(client, date=datetime.date.today() - datetime.timedelta(days=1), status="expired")
+    user_ids = await bulk_users(scaled(10000))
+    await bulk_trackers(user_ids, date, solved_every=3)
+
+    async with session_scope() as session:
+        created = datetime.datetime.combine(date, datetime.time(10))
+        await session.exec(insert(TaskAttempt), params=[
+            {"date": date, "user_id": user_id, "text": f"wrong {i % 50}", "correct": False, "created": created}
+            for i, user_id in enumerate(user_ids)
+        ])
+        # the counters the answer route would have kept while the trackers filled up
+        await session.exec(insert(TaskStats).values(date=date, **await count_task_stats(session, date)))
+        await session.commit()
+
+    live, live_ms = await stats_ms(client, date)
+    async with session_scope() as session:
+        task = await session.get(Task, date)
+        with timer() as freeze:
+            await freeze_task_stats(session, date, task.open_time)
+    frozen, frozen_ms = await stats_ms(client, date)
+
+    assert live["participants"] == len(user_ids)
+    assert live["solves"] == len(user_ids[::3])
+    assert len(live["top_wrong_answers"]) == 10
+    assert frozen["frozen"] and not live["frozen"]
+    assert {**live, "frozen": True} == frozen
+
+    bench(
+        trackers=len(user_ids),
+        live_ms=live_ms,
+        freeze_ms=freeze["seconds"] * 1000,
+        frozen_ms=frozen_ms,
+    )
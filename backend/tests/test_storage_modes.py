@@ -0,0 +1,82 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import SQLITE_PRAGMAS, build_engine
+from app.models.user import User, TaskTracker
+from app.settings import DB_POOL_SIZE, DB_MAX_OVERFLOW
+from conftest import TEST_DIR, scaled, timer
+
+pytestmark = pytest.mark.anyio
+
+SQLITE_MODES = {
+    "wal_normal": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+    "wal_full": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "delete_full": {"journal_mode": "DELETE", "synchronous": "FULL"},
+}
+POSTGRES_URL = os.environ.get("BENCH_POSTGRES_URL")
+
+
+def storage_modes():
+    modes = [pytest.param(f"sqlite+aiosqlite:///{os.path.join(TEST_DIR, name)}.db", pragmas, id=name)
+             for name, pragmas in SQLITE_MODES.items()]
+    modes.append(pytest.param(POSTGRES_URL, {}, id="postgresql", marks=pytest.mark.skipif(
+        not POSTGRES_URL, reason="set BENCH_POSTGRES_URL to a scratch database, e.g. postgresql+asyncpg://...")))
+    return modes
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("db_url, pragmas", storage_modes())
+async def test_tracker_update_throughput(db_url, pragmas, monkeypatch, bench):
+    """Committed hints_used + 1 updates per second, one session each, as many in flight as the pool allows."""
+    for pragma, value in pragmas.items():
+        monkeypatch.setitem(SQLITE_PRAGMAS, pragma, value)
+    engine = build_engine(db_url)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    date = datetime.date.today()
+    user_ids = [uuid.uuid4().hex for _ in range(50)]
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": user_id, "username": user_id, "full_name": "-", "email": f"{user_id}@example.com",
+             "email_verified": False, "hashed_password": "-"} for user_id in user_ids
+        ])
+        await conn.execute(insert(TaskTracker), [{"date": date, "user_id": user_id} for user_id in user_ids])
+
+    in_flight = asyncio.Semaphore(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    updates = scaled(500)
+
+    async def unlock(user_id: str):
+        async with in_flight, sessions() as session:
+            await session.exec(
+                update(TaskTracker)
+                .where(TaskTracker.user_id == user_id, TaskTracker.date == date, ~TaskTracker.solved)
+                .values(hints_used=TaskTracker.hints_used + 1)
+            )
+            await session.commit()
+
+    try:
+        with timer() as elapsed:
+            await asyncio.gather(*[unlock(user_ids[i % len(user_ids)]) for i in range(updates)])
+
+        async with sessions() as session:
+            trackers = (await session.exec(
+                TaskTracker.__table__.select().where(TaskTracker.date == date)
+            )).all()
+        assert sum(tracker.hints_used for tracker in trackers) == updates
+    finally:
+        await engine.dispose()
+
+    bench(
+        updates=updates,
+        updates_per_s=updates / elapsed["seconds"],
+    )
@@ -0,0 +1,52 @@
+import pytest
+
+import app.models.user
+import app.utils.security
+from app.models.user import user_cache
+from app.settings import ATTEMPTS_PER_RESET
+from conftest import create_task, scaled, signup, timer
+
+pytestmark = pytest.mark.anyio
+
+ANSWER = "^s n o w m a n$"
+
+# db: every request loads the user; cached: user_cache in front of that; stateless: claims from the token
+TOKEN_MODES = {"db": (False, 0), "cached": (False, None), "stateless": (True, None)}
+
+
+@pytest.fixture(params=TOKEN_MODES)
+def token_mode(request, monkeypatch):
+    stateless, cache_ttl = TOKEN_MODES[request.param]
+    monkeypatch.setattr(app.models.user, "STATELESS_TOKENS", stateless)
+    monkeypatch.setattr(app.utils.security, "STATELESS_TOKENS", stateless)
+    if cache_ttl is not None:
+        monkeypatch.setattr(user_cache, "ttl", cache_ttl)
+    return request.param
+
+
+@pytest.mark.benchmark
+async def test_authenticated_request_rate(client, token_mode, bench):
+    """Requests per second on /user/ and /task/answer, sent one after another, per token mode."""
+    await create_task(client, answer=ANSWER)
+    users = [await signup(client, f"user{i}") for i in range(scaled(20))]
+    profile = (await client.get("/user/", headers=users[0])).json()
+
+    requests = scaled(500)
+    hits = user_cache.hits
+    with timer() as reads:
+        for i in range(requests):
+            response = await client.get("/user/", headers=users[i % len(users)])
+            assert response.status_code == 200
+    assert (await client.get("/user/", headers=users[0])).json() == profile
+
+    answers = len(users) * ATTEMPTS_PER_RESET
+    with timer() as writes:
+        for i in range(answers):
+            response = await client.post("/task/answer", params={"answer": f"guess {i}"}, headers=users[i % len(users)])
+            assert response.json()["message"] == "incorrect"
+
+    bench(
+        user_per_s=requests / reads["seconds"],
+        answer_per_s=answers / writes["seconds"],
+        user_cache_hits=user_cache.hits - hits,
+    )